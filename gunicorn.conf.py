@@ -0,0 +1,27 @@
+import os
+
+
+# gunicorn -c gunicorn.conf.py, from the root of the repository like dashboard.py.
+wsgi_app = "wsgi:server"
+pythonpath = "src"
+bind = "0.0.0.0:8050"
+
+# Import and warm up the dashboard once in the master, every worker forked from it starts
+# ready instead of preparing the data again.
+preload_app = True
+workers = int(os.environ.get("WORKERS", 2))
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", 4))
+# Loading another group can take a while on large chats.
+timeout = 120
+
+
+def on_starting(server):
+    # Runs in the master after the preload, before any worker is forked. Every worker keeps
+    # and refreshes a copy of the chats of its own, so the data version a page got from one
+    # worker would not describe the data of another (nor the results cached under it).
+    # Chats that poll for new messages are therefore served by one worker with its threads.
+    from dashboard import live_refresh
+    if server.num_workers > 1 and live_refresh():
+        server.log.warning("refreshSeconds is set, serving with a single worker")
+        server.num_workers = 1
@@ -0,0 +1,483 @@
+import copy
+import itertools
+import re
+import sys
+import numpy as np
+import pandas as pd
+from collections import Counter
+from instrumentation import instrumented
+from parallel import map_partitions
+from sentiment_aggregates import FIELDS, sentiment_array
+from utils import MESSAGE_TYPE_MAP, trie_pattern
+
+
+MESSAGE_TYPES = list(dict.fromkeys(MESSAGE_TYPE_MAP.values()))
+# Axis of the count cube, unmapped message types (mostly text) are counted as "other".
+CUBE_TYPES = [*MESSAGE_TYPES, "other"]
+
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+
+# Upper bounds of the reply latency buckets, the last bucket is open ended.
+LATENCY_EDGES = np.array([10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 43200, 86400, 172800, 604800]) * 1000
+LATENCY_LABELS = ["<10s", "<30s", "<1m", "<2m", "<5m", "<10m", "<30m", "<1h", "<2h", "<6h", "<12h", "<1d", "<2d", "<1w", "1w+"]
+# A silence this long ends a conversation, the next message opens a new one.
+SESSION_GAP_MS = HOUR_MS
+
+
+@instrumented
+def emoji_counts(df: pd.DataFrame) -> pd.Series:
+    # Sparse sender x month x emoji count matrix, indexed by (sender_name, month_year, emojis).
+    # Groups keep the order in which each emoji first appeared so ties rank like
+    # Counter.most_common.
+    emojis = df[["sender_name", "month_year", "emojis"]].explode("emojis").dropna()
+    return emojis.groupby(["sender_name", "month_year", "emojis"], sort=False, observed=True).size()
+
+
+def alias_lookup(alias_dict: dict) -> dict:
+    lookup = {}
+    for canonical, aliases in alias_dict.items():
+        for name in [canonical, *aliases]:
+            lookup.setdefault(str(name).lower().strip(), canonical)
+    return lookup
+
+
+def normalize_senders(names: pd.Series, alias_dict: dict) -> pd.Series:
+    # Looked up once per distinct name, a chat has far fewer senders than messages.
+    names = names.astype(str)
+    lookup = alias_lookup(alias_dict)
+    return names.map({name: lookup.get(name.lower().strip(), name) for name in names.unique()})
+
+
+@instrumented
+def scan_mentions(df: pd.DataFrame, alias_dict: dict = None, names: list[str] = None, months: list[str] = None) -> tuple[list[str], np.ndarray, np.ndarray]:
+    # Counts name mentions and direct (@ number) mentions in one sweep over the messages.
+    # Both matrices are indexed [mentioned, sender, month] in the order of the returned names,
+    # which are the given names followed by the senders of df, and of the given months (a
+    # single layer for all messages without them).
+    alias_dict = alias_dict or {}
+    df = df[df["sender_name"].notna() & (df["sender_name"].str.lower() != "other")]
+
+    senders = normalize_senders(df["sender_name"], alias_dict)
+    names = list(dict.fromkeys([*(names or []), *senders.unique()]))
+    sender_codes = senders.map({name: i for i, name in enumerate(names)}).to_numpy()
+
+    if months is None:
+        month_codes, n_months = np.zeros(len(df), dtype=np.intp), 1
+    else:
+        month_codes, n_months = pd.Index(months).get_indexer(df["month_year"]), len(months)
+
+    # Every name or alias points to all users it may refer to, aliases can be shared.
+    tokens = {}
+    for i, mentioned in enumerate(names):
+        for name in [mentioned, *alias_dict.get(mentioned, [])]:
+            name = str(name).lower()
+            mention_targets, direct_targets = tokens.setdefault(name, (set(), set()))
+            mention_targets.add(i)
+            if name.isdigit():
+                direct_targets.add(i)
+
+    shape = (len(names), len(names), n_months)
+    if not tokens or df.empty:
+        return names, np.zeros(shape, dtype=np.int32), np.zeros(shape, dtype=np.int32)
+
+    pattern = re.compile(r"\b" + trie_pattern(tokens) + r"\b", re.IGNORECASE)
+    # Each distinct text is searched once, its hits count for every message with that text.
+    text_codes, texts = pd.factorize(df["text_data"])
+    hits = pd.Series(pd.Series(texts).astype(str).str.findall(pattern).to_numpy()).explode().dropna()
+    token_codes, hit_tokens = pd.factorize(hits.str.lower())
+    messages = pd.DataFrame({"text": text_codes, "row": np.arange(len(df))})
+    hit_rows = pd.DataFrame({"text": hits.index, "token": token_codes}).merge(messages, on="text")
+    token_codes, hit_rows = hit_rows["token"].to_numpy(), hit_rows["row"].to_numpy()
+
+    # Hits per (token, sender, month) that occur, spread onto the users each token refers to.
+    # Only these cells are touched, a dense token x sender x month cube would mostly be zeros.
+    cells, counts = np.unique(np.ravel_multi_index((token_codes, sender_codes[hit_rows], month_codes[hit_rows]), (len(hit_tokens), *shape[1:])), return_counts=True)
+    token_codes, sender_month = np.divmod(cells, len(names) * n_months)
+
+    def spread(targets: list[list[int]]) -> np.ndarray:
+        lengths = np.array([len(t) for t in targets], dtype=np.intp)
+        target_codes = np.array([i for t in targets for i in t], dtype=np.intp)
+        first_target = np.cumsum(lengths) - lengths
+        # One entry per (cell, target of the cell's token).
+        per_cell = lengths[token_codes]
+        cell = np.repeat(np.arange(len(cells)), per_cell)
+        rank = np.arange(len(cell)) - (np.cumsum(per_cell) - per_cell)[cell]
+        flat = target_codes[first_target[token_codes][cell] + rank] * (len(names) * n_months) + sender_month[cell]
+        matrix = np.zeros(shape, dtype=np.int32)
+        np.add.at(matrix.reshape(-1), flat, counts[cell].astype(np.int32))
+        diagonal = np.arange(len(names))
+        matrix[diagonal, diagonal] = 0
+        return matrix
+
+    mentions = spread([sorted(tokens[token][0]) for token in hit_tokens])
+    direct_mentions = spread([sorted(tokens[token][1]) for token in hit_tokens])
+    return names, mentions, direct_mentions
+
+
+@instrumented
+def scan_conversations(shape: tuple, timestamps: np.ndarray, sender_codes: np.ndarray, month_codes: np.ndarray) -> tuple[np.ndarray, ...]:
+    # Conversational dynamics from the gaps between consecutive messages, in one pass over
+    # the messages in time order: reply latencies [replier, month, bucket] and replies
+    # [replier, replied to, month] of every message following one by somebody else, the
+    # conversations opened [sender, month] after a silence of SESSION_GAP_MS and the time
+    # [sender, month] between the messages within a conversation.
+    n_senders, n_months = shape
+    order = np.argsort(timestamps, kind="stable")
+    timestamps, sender_codes, month_codes = timestamps[order], sender_codes[order], month_codes[order]
+    gaps = np.diff(timestamps)
+
+    reply = sender_codes[1:] != sender_codes[:-1]
+    repliers, months = sender_codes[1:][reply], month_codes[1:][reply]
+    latency_counts = _bincount((n_senders, n_months, len(LATENCY_LABELS)), repliers, months, np.searchsorted(LATENCY_EDGES, gaps[reply], side="right"))
+    replies = _bincount((n_senders, n_senders, n_months), repliers, sender_codes[:-1][reply], months, dtype=np.int32)
+
+    opens = np.ones(len(timestamps), dtype=bool)
+    opens[1:] = gaps >= SESSION_GAP_MS
+    session_starts = _bincount((n_senders, n_months), sender_codes[opens], month_codes[opens])
+    within = ~opens[1:]
+    session_ms = _bincount((n_senders, n_months), sender_codes[1:][within], month_codes[1:][within], weights=gaps[within])
+
+    return latency_counts, replies, session_starts, session_ms
+
+
+def month_of(timestamp: int) -> str:
+    return str(np.datetime64(timestamp, "ms").astype("datetime64[M]"))
+
+
+def _bincount(shape: tuple, *codes: np.ndarray, weights: np.ndarray = None, dtype=np.int64) -> np.ndarray:
+    flat = np.ravel_multi_index(codes, shape) if codes[0].size else np.zeros(0, dtype=np.intp)
+    counts = np.bincount(flat, weights=weights, minlength=int(np.prod(shape))).reshape(shape)
+    return counts.astype(dtype)
+
+
+def _align(keys: list, new_keys: list) -> np.ndarray:
+    # Positions of new_keys within keys, unknown keys are appended.
+    index = {key: i for i, key in enumerate(keys)}
+    for key in new_keys:
+        if key not in index:
+            index[key] = len(keys)
+            keys.append(key)
+    return np.array([index[key] for key in new_keys], dtype=np.intp)
+
+
+def _pad(array: np.ndarray, shape: tuple) -> np.ndarray:
+    # Always a new array, also when nothing is padded.
+    return np.pad(array, [(0, size - current) for current, size in zip(array.shape, shape)])
+
+
+def _updated(counter: Counter | None, other: Counter) -> Counter:
+    # A new counter instead of updating the one that copies of the aggregates share.
+    updated = Counter(counter or ())
+    updated.update(other)
+    return updated
+
+
+# Arrays with a month (or day) axis, and its position.
+MONTH_AXES = {
+    "counts": 1, "sentiments": 1, "length_sums": 1, "emoji_totals": 1, "link_counts": 1, "mentions": 2, "direct_mentions": 2,
+    "latency_counts": 1, "replies": 2, "session_starts": 1, "session_ms": 1,
+}
+DAY_AXES = {"day_counts": 1}
+
+# Distinguishes aggregates of different chats (or reloads) whose versions may coincide.
+chat_tokens = itertools.count()
+
+
+class ChatAggregates:
+    # Mergeable counts over the messages of a chat. The arrays are indexed by the position
+    # of a sender in `senders` and of a month in `months`, so aggregates of different
+    # chunks of messages are combined by aligning those keys and adding up the arrays.
+    # Message counts live in one sender x month x weekday x hour x type cube, every count
+    # the dashboard shows is a slice or a sum over some of its axes. Daily counts per sender
+    # (days since the epoch) back the finer activity plots.
+
+    def __init__(self, alias_dict: dict = None):
+        self.alias_dict = alias_dict or {}
+        self.senders: list[str] = []
+        self.months: list[str] = []
+        self.counts = np.zeros((0, 0, 7, 24, len(CUBE_TYPES)), dtype=np.int32)
+        self.sender_index: dict[str, int] = {}
+        self.month_index: dict[str, int] = {}
+        self.days: list[int] = []
+        self.day_counts = np.zeros((0, 0), dtype=np.int32)
+        self.length_sums = np.zeros((0, 0), dtype=np.int64)
+        self.emoji_totals = np.zeros((0, 0), dtype=np.int64)
+        self.link_counts = np.zeros((0, 0), dtype=np.int64)
+        self.sentiments = np.zeros((0, 0, len(FIELDS)))
+        # Conversations, see scan_conversations. The first and last message (timestamp, sender)
+        # join the conversations of chunks merged in time order.
+        self.latency_counts = np.zeros((0, 0, len(LATENCY_LABELS)), dtype=np.int64)
+        self.replies = np.zeros((0, 0, 0), dtype=np.int32)
+        self.session_starts = np.zeros((0, 0), dtype=np.int64)
+        self.session_ms = np.zeros((0, 0), dtype=np.int64)
+        self.first_message: tuple[int, str] | None = None
+        self.last_message: tuple[int, str] | None = None
+        self.emojis: dict[str, Counter] = {}
+        self.monthly_emojis: dict[tuple[str, str], Counter] = {}
+        self.contains_sentiments = False
+
+        # Everyone in senderAliases can be mentioned before they have written anything.
+        self.mention_names: list[str] = list(self.alias_dict)
+        self.mention_senders: set[str] = set()
+        self.mentions = np.zeros((len(self.mention_names), len(self.mention_names), 0), dtype=np.int32)
+        self.direct_mentions = np.zeros_like(self.mentions)
+
+        self.version = 0
+        self.token = next(chat_tokens)
+        # (start month, end month, senders) of a view returned by select, None for all messages.
+        self.selection = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, alias_dict: dict = None, n_jobs: int = 1) -> "ChatAggregates":
+        chat = cls(alias_dict)
+        chat.add(df, n_jobs)
+        return chat
+
+    @instrumented
+    def add(self, df: pd.DataFrame, n_jobs: int = 1):
+        # Partitions of df are counted on n_jobs processes, by a copy without the counts
+        # so far since that is what gets pickled to the workers.
+        counter = ChatAggregates(self.alias_dict)
+        counter.mention_names = list(self.mention_names)
+        for partial in map_partitions(counter.count, df, n_jobs):
+            self.merge(partial)
+
+    @instrumented
+    def count(self, df: pd.DataFrame) -> "ChatAggregates":
+        # Aggregates of an enriched frame, using the mention names known so far.
+        df = df[df["sender_name"].notna()]
+        partial = ChatAggregates(self.alias_dict)
+
+        sender_codes, senders = pd.factorize(df["sender_name"])
+        month_codes, months = pd.factorize(df["month_year"])
+        # Interned so that the senders, months and emojis of all loaded chats share their strings.
+        partial.senders, partial.months = [sys.intern(str(sender)) for sender in senders], [sys.intern(month) for month in months]
+        n_senders, n_months = len(senders), len(months)
+
+        # Weekday (the epoch was a Thursday) and hour straight from the epoch milliseconds, the
+        # cube type of every distinct message type.
+        timestamps = df["timestamp"].to_numpy(dtype=np.int64)
+        raw_type_codes, raw_types = pd.factorize(df["message_type"], use_na_sentinel=False)
+        cube_types = np.array([CUBE_TYPES.index(MESSAGE_TYPE_MAP.get(str(t), "other")) for t in raw_types], dtype=np.intp)
+        partial.counts = _bincount(
+            (n_senders, n_months, 7, 24, len(CUBE_TYPES)),
+            sender_codes,
+            month_codes,
+            (timestamps // DAY_MS + 3) % 7,
+            timestamps // HOUR_MS % 24,
+            cube_types[raw_type_codes],
+            dtype=np.int32,
+        )
+        partial.latency_counts, partial.replies, partial.session_starts, partial.session_ms = scan_conversations(
+            (n_senders, n_months), timestamps, sender_codes, month_codes
+        )
+        if len(timestamps):
+            first, last = np.argmin(timestamps), len(timestamps) - 1 - np.argmax(timestamps[::-1])
+            partial.first_message = (int(timestamps[first]), partial.senders[sender_codes[first]])
+            partial.last_message = (int(timestamps[last]), partial.senders[sender_codes[last]])
+
+        day_codes, days = pd.factorize(timestamps // DAY_MS)
+        partial.days = days.tolist()
+        partial.day_counts = _bincount((n_senders, len(days)), sender_codes, day_codes, dtype=np.int32)
+
+        partial.length_sums = _bincount((n_senders, n_months), sender_codes, month_codes, weights=df["message_length"].to_numpy())
+        partial.emoji_totals = _bincount((n_senders, n_months), sender_codes, month_codes, weights=df["emoji_count"].to_numpy())
+        partial.link_counts = _bincount((n_senders, n_months), sender_codes, month_codes, weights=df["has_link"].to_numpy())
+
+        partial.contains_sentiments = "sentiment" in df.columns
+        partial.sentiments = np.zeros((n_senders, n_months, len(FIELDS)))
+        if partial.contains_sentiments:
+            scores = df["score"] if "score" in df.columns else None
+            partial.sentiments = sentiment_array((n_senders, n_months), sender_codes, month_codes, df["sentiment"], scores)
+
+        for (sender, month, emoji), count in emoji_counts(df).items():
+            sender, month, emoji = sys.intern(str(sender)), sys.intern(month), sys.intern(emoji)
+            partial.emojis.setdefault(sender, Counter())[emoji] += count
+            partial.monthly_emojis.setdefault((sender, month), Counter())[emoji] = count
+
+        partial.mention_names, partial.mentions, partial.direct_mentions = scan_mentions(df, self.alias_dict, self.mention_names, partial.months)
+        mentioning = df[df["sender_name"].str.lower() != "other"]["sender_name"]
+        partial.mention_senders = set(normalize_senders(mentioning, self.alias_dict).unique())
+
+        return partial
+
+    def copy(self) -> "ChatAggregates":
+        # A copy that can be merged into while others still read this one. Merging replaces
+        # the arrays, counters and sets instead of changing them in place, so only the key
+        # lists and the dicts holding the counters need copying.
+        chat = copy.copy(self)
+        chat.senders, chat.months, chat.days = list(self.senders), list(self.months), list(self.days)
+        chat.mention_names = list(self.mention_names)
+        chat.emojis, chat.monthly_emojis = dict(self.emojis), dict(self.monthly_emojis)
+        return chat
+
+    @instrumented
+    def merge(self, other: "ChatAggregates"):
+        senders = _align(self.senders, other.senders)
+        months = _align(self.months, other.months)
+        n_senders, n_months = len(self.senders), len(self.months)
+
+        self.counts = _pad(self.counts, (n_senders, n_months, *self.counts.shape[2:]))
+        self.counts[np.ix_(senders, months)] += other.counts
+        self.sentiments = _pad(self.sentiments, (n_senders, n_months, len(FIELDS)))
+        self.sentiments[np.ix_(senders, months)] += other.sentiments
+
+        self.latency_counts = _pad(self.latency_counts, (n_senders, n_months, len(LATENCY_LABELS)))
+        self.latency_counts[np.ix_(senders, months)] += other.latency_counts
+        self.replies = _pad(self.replies, (n_senders, n_senders, n_months))
+        self.replies[np.ix_(senders, senders, months)] += other.replies
+
+        for name in ["length_sums", "emoji_totals", "link_counts", "session_starts", "session_ms"]:
+            array = _pad(getattr(self, name), (n_senders, n_months))
+            array[np.ix_(senders, months)] += getattr(other, name)
+            setattr(self, name, array)
+
+        days = _align(self.days, other.days)
+        self.day_counts = _pad(self.day_counts, (n_senders, len(self.days)))
+        self.day_counts[np.ix_(senders, days)] += other.day_counts
+
+        for sender, counter in other.emojis.items():
+            self.emojis[sender] = _updated(self.emojis.get(sender), counter)
+        for key, counter in other.monthly_emojis.items():
+            self.monthly_emojis[key] = _updated(self.monthly_emojis.get(key), counter)
+
+        mentioned = _align(self.mention_names, other.mention_names)
+        n_names = len(self.mention_names)
+        self.mentions = _pad(self.mentions, (n_names, n_names, n_months))
+        self.mentions[np.ix_(mentioned, mentioned, months)] += other.mentions
+        self.direct_mentions = _pad(self.direct_mentions, (n_names, n_names, n_months))
+        self.direct_mentions[np.ix_(mentioned, mentioned, months)] += other.direct_mentions
+        self.mention_senders = self.mention_senders | other.mention_senders
+
+        self.contains_sentiments |= other.contains_sentiments
+        self.sort_periods()
+        self.sender_index = {sender: i for i, sender in enumerate(self.senders)}
+        self.month_index = {month: i for i, month in enumerate(self.months)}
+        self.join_conversations(other)
+        self.version += 1
+
+    def join_conversations(self, other: "ChatAggregates"):
+        # The first message of `other` was counted without the one before it, the last of
+        # self. Only chunks that follow each other in time are joined, as they are merged
+        # by add and on refresh.
+        if other.first_message is None:
+            return
+        if self.last_message is not None and self.last_message[0] <= other.first_message[0]:
+            (previous_time, previous_sender), (time, sender) = self.last_message, other.first_message
+            gap, i, month = time - previous_time, self.sender_index[sender], self.month_index[month_of(time)]
+            if gap < SESSION_GAP_MS:
+                self.session_starts[i, month] -= 1
+                self.session_ms[i, month] += gap
+            if sender != previous_sender:
+                self.latency_counts[i, month, np.searchsorted(LATENCY_EDGES, gap, side="right")] += 1
+                self.replies[i, self.sender_index[previous_sender], month] += 1
+
+        if self.first_message is None or other.first_message[0] < self.first_message[0]:
+            self.first_message = other.first_message
+        if self.last_message is None or other.last_message[0] >= self.last_message[0]:
+            self.last_message = other.last_message
+
+    def sort_periods(self):
+        # Months and days stay in chronological order so that a range of them is a slice.
+        # Chunks are mostly merged in order, then nothing needs to move.
+        for periods, axes in [("months", MONTH_AXES), ("days", DAY_AXES)]:
+            keys = getattr(self, periods)
+            order = np.argsort(keys, kind="stable")
+            if (order == np.arange(len(order))).all():
+                continue
+
+            setattr(self, periods, [keys[i] for i in order])
+            for name, axis in axes.items():
+                setattr(self, name, np.take(getattr(self, name), order, axis=axis))
+
+    def select(self, start: str = None, end: str = None, senders: list[str] = None) -> "ChatAggregates":
+        # Aggregates of the messages the given senders sent from month `start` through `end`
+        # ("YYYY-MM", open ended when missing). The range is found by binary search on the
+        # sorted months and cut out of the arrays as a slice, without touching any message.
+        if start is None and end is None and senders is None:
+            return self
+
+        months = np.array(self.months)
+        first = np.searchsorted(months, start, side="left") if start else 0
+        last = np.searchsorted(months, end, side="right") if end else len(months)
+        rows = [self.sender_index[sender] for sender in senders if sender in self.sender_index] if senders is not None else slice(None)
+
+        view = ChatAggregates(self.alias_dict)
+        view.token, view.version = self.token, self.version
+        view.selection = (start, end, tuple(senders) if senders is not None else None)
+        view.contains_sentiments = self.contains_sentiments
+
+        view.senders = self.senders[rows] if isinstance(rows, slice) else [self.senders[i] for i in rows]
+        view.months = self.months[first:last]
+        view.sender_index = {sender: i for i, sender in enumerate(view.senders)}
+        view.month_index = {month: i for i, month in enumerate(view.months)}
+        for name in ["counts", "sentiments", "length_sums", "emoji_totals", "link_counts", "latency_counts", "session_starts", "session_ms"]:
+            setattr(view, name, getattr(self, name)[rows, first:last])
+        view.replies = self.replies[rows][:, rows, first:last]
+
+        # Days from the first of month `start` up to the first of the month after `end`.
+        days = np.array(self.days, dtype=np.int64)
+        first_day = np.searchsorted(days, np.datetime64(start, "D").astype(np.int64)) if start else 0
+        last_day = np.searchsorted(days, (np.datetime64(end, "M") + 1).astype("datetime64[D]").astype(np.int64)) if end else len(days)
+        view.days = self.days[first_day:last_day]
+        view.day_counts = self.day_counts[rows, first_day:last_day]
+
+        selected, in_range = set(view.senders), set(view.months)
+        if first == 0 and last == len(months):
+            view.emojis = {sender: counter for sender, counter in self.emojis.items() if sender in selected}
+        for (sender, month), counter in self.monthly_emojis.items():
+            if sender in selected and month in in_range:
+                view.monthly_emojis[(sender, month)] = counter
+                if first > 0 or last < len(months):
+                    view.emojis.setdefault(sender, Counter()).update(counter)
+
+        # Mentions of and by those who wrote within the selection.
+        active = pd.Series(view.senders)[view.message_counts.sum(axis=1) > 0]
+        view.mention_names = self.mention_names
+        view.mention_senders = self.mention_senders & set(normalize_senders(active, self.alias_dict))
+        view.mentions = self.mentions[..., first:last]
+        view.direct_mentions = self.direct_mentions[..., first:last]
+
+        return view
+
+    def cube(self, sender: str = None) -> np.ndarray:
+        # Month x weekday x hour x type counts of one sender, or of everyone without a sender.
+        if sender is None:
+            return self.counts.sum(axis=0)
+        if sender not in self.sender_index:
+            return np.zeros(self.counts.shape[1:], dtype=self.counts.dtype)
+        return self.counts[self.sender_index[sender]]
+
+    @property
+    def message_counts(self) -> np.ndarray:
+        return self.counts.sum(axis=(2, 3, 4), dtype=np.int64)
+
+    @property
+    def weekday_counts(self) -> np.ndarray:
+        return self.counts.sum(axis=(1, 3, 4), dtype=np.int64)
+
+    @property
+    def hour_counts(self) -> np.ndarray:
+        return self.counts.sum(axis=(1, 2, 4), dtype=np.int64)
+
+    @property
+    def type_counts(self) -> np.ndarray:
+        return self.counts[..., :len(MESSAGE_TYPES)].sum(axis=(1, 2, 3), dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        # Rough memory footprint, the arrays plus the emoji counters.
+        arrays = [value for value in vars(self).values() if isinstance(value, np.ndarray)]
+        counters = [*self.emojis.values(), *self.monthly_emojis.values()]
+        return sum(array.nbytes for array in arrays) + sum(sys.getsizeof(counter) for counter in counters)
+
+    def sender_series(self, values: np.ndarray, name: str) -> pd.Series:
+        return pd.Series(values, index=pd.Index(self.senders, name="sender_name"), name=name).sort_index()
+
+    def sender_month_frame(self, values: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(
+            values,
+            index=pd.Index(self.senders, name="sender_name"),
+            columns=pd.Index(self.months, name="month_year"),
+        ).sort_index().sort_index(axis=1)
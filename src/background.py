@@ -0,0 +1,99 @@
+import functools
+import os
+import uuid
+import diskcache
+from dash import DiskcacheManager
+from figure_cache import FigureCache
+from instrumentation import metrics
+
+
+BACKGROUND_DIR = "./data/.cache/background"
+# Results are kept this long after their last request, for identical requests to share.
+RESULT_SECONDS = 600
+# A job still marked as running after this long is considered lost.
+JOB_SECONDS = 600
+# Job of a request whose result is stored already. The renderer leaves a falsy job out of
+# its polls, which then only fetch the result.
+NO_JOB = 0
+
+
+class CoalescingManager(DiskcacheManager):
+    # Background callbacks in processes forked from the server, with their results and
+    # progress in a diskcache shared by all server processes. Identical requests (the same
+    # callback with the same arguments) share one job while it runs instead of each
+    # starting their own, the job is only killed once every request waiting for it moved on.
+    # What a job records in its metrics and figure cache would die with its process, it is
+    # left in the diskcache for the server process that collects the result.
+
+    def __init__(self, cache: diskcache.Cache, figures: FigureCache = None, **kwargs):
+        # Set first, the callbacks defined so far are registered by DiskcacheManager.
+        self.figures = figures
+        super().__init__(cache, **kwargs)
+
+    def make_job_fn(self, fn, progress, key=None):
+        return super().make_job_fn(self.reporting(fn), progress, key)
+
+    def reporting(self, fn):
+        # The callback as run in the job process, the job is the pid of that process. Its
+        # report is stored before the result, so it is there once the result is.
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            metrics.stats = {}
+            state = self.figures.state() if self.figures else None
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                report = {"metrics": metrics.snapshot(), "figures": self.figures.delta(state) if self.figures else None}
+                self.handle.set(("report", os.getpid()), report, expire=RESULT_SECONDS)
+
+        return run
+
+    def call_job_fn(self, key, job_fn, args, context):
+        if self.result_ready(key):
+            # Computed before, nothing needs to run.
+            return NO_JOB
+
+        with self.handle.transact():
+            job = self.handle.get(("job", key))
+            if job is not None and self.job_running(job):
+                self.handle.incr(("waiting", job))
+                return job
+
+        job = super().call_job_fn(key, job_fn, args, context)
+        with self.handle.transact():
+            self.handle.set(("job", key), job, expire=JOB_SECONDS)
+            self.handle.set(("waiting", job), 1, expire=JOB_SECONDS)
+        return job
+
+    def get_result(self, key, job):
+        result = super().get_result(key, job)
+        if job and result is not self.UNDEFINED:
+            self.collect(int(job))
+        return result
+
+    def collect(self, job: int):
+        # Only the first of the requests sharing a job finds its report.
+        report = self.handle.pop(("report", job), default=None)
+        if report is None:
+            return
+        metrics.merge(report["metrics"])
+        if self.figures and report["figures"]:
+            self.figures.merge(report["figures"])
+
+    def job_running(self, job):
+        return bool(job) and super().job_running(job)
+
+    def terminate_job(self, job):
+        # Called when a request is superseded (oldJob), cancelled or got its result.
+        if not job or not int(job):
+            return
+        with self.handle.transact():
+            waiting = self.handle.decr(("waiting", int(job)), default=1)
+        if waiting <= 0:
+            super().terminate_job(job)
+
+
+def background_manager(directory: str = BACKGROUND_DIR, figures: FigureCache = None) -> CoalescingManager:
+    # Keyed by this start of the server as well, results of an earlier one are never served.
+    run = uuid.uuid4().hex
+    return CoalescingManager(diskcache.Cache(directory), figures, cache_by=[lambda: run], expire=RESULT_SECONDS)
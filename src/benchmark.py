@@ -0,0 +1,424 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import closing
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import emoji
+import numpy as np
+import pandas as pd
+import data
+import plots
+from aggregates import ChatAggregates
+from parallel import default_workers
+from sentiment_analysis import get_message_sentiments, label_scores
+
+
+# Header of a message table exported as described in DATA_EXTRACTION.md.
+EXPORT_COLUMNS = [
+    "_id", "chat_row_id", "from_me", "key_id", "sender_jid_row_id", "status", "broadcast", "recipient_count",
+    "participant_hash", "origination_flags", "origin", "timestamp", "received_timestamp", "receipt_server_timestamp",
+    "message_type", "text_data", "starred", "lookup_tables", "message_add_on_flags", "sort_id", "view_mode", "translated_text",
+]
+
+WORDS = ["ok", "haha", "see you later", "what?", "Straße", "lol", "#1", "2024", "yes", "no way", "tonight", "good morning"]
+EMOJIS = ["😂", "👍🏽", "❤️", "🥲", "👨‍👩‍👧", "🇩🇪", "🔥", "🙏"]
+
+# chat_row_id of the synthetic chat, also in its msgstore.db.
+CHAT_ROW_ID = 1
+
+# Share of each message type, text messages (0) are the only ones with text.
+MESSAGE_TYPE_SHARES = {0: 0.86, 1: 0.05, 13: 0.01, 20: 0.04, 5: 0.005, 16: 0.005, 15: 0.02}
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+RESULTS_DIR = "./benchmarks"
+
+# Run in a fresh interpreter per measurement, in a directory holding data/config.json and
+# data/group-chat.csv. Prints the seconds after every phase of the startup and the memory of
+# the process as JSON lines: its resident memory, for the forked worker only the pages it
+# does not share with its parent. The worker serves the first page like a gunicorn worker.
+STARTUP_SCRIPT = """
+import json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+
+def memory(fields):
+    with open("/proc/self/smaps_rollup") as f:
+        return sum(int(line.split()[1]) * 1024 for line in f if line.split(":")[0] in fields)
+
+def phase(name, start, fields=("Rss",)):
+    print(json.dumps({name: {"seconds": time.perf_counter() - start, "peak_bytes": memory(fields)}}), flush=True)
+
+start = time.perf_counter()
+import dashboard
+phase("import", start)
+
+start = time.perf_counter()
+dashboard.warm_up()
+phase("warm_up", start)
+
+start = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    response = dashboard.app.server.test_client().post("/_dash-update-component", json={
+        "output": "page.children", "outputs": {"id": "page", "property": "children"},
+        "inputs": [{"id": "url", "property": "pathname", "value": "/"}], "changedPropIds": ["url.pathname"],
+    })
+    if response.status_code == 200:
+        phase("forked_worker", start, ("Private_Clean", "Private_Dirty"))
+    os._exit(0 if response.status_code == 200 else 1)
+if os.waitpid(pid, 0)[1]:
+    sys.exit("The forked worker could not serve the page")
+"""
+
+
+def synthetic_export(
+    rows: int,
+    members: int = 8,
+    emoji_rate: float = 0.1,
+    link_rate: float = 0.03,
+    mention_rate: float = 0.05,
+    message_types: dict = None,
+    years: int = 5,
+    sentiments: bool = True,
+    seed: int = 0,
+) -> tuple[pd.DataFrame, dict]:
+    # A chat in the group-chat.csv schema and the config.json to read it with, the same for
+    # the same arguments. emoji_rate is the share of emojis among the words of a text, the
+    # link and mention rates are shares of text messages.
+    rng = np.random.default_rng(seed)
+    message_types = message_types or MESSAGE_TYPE_SHARES
+
+    names = [f"member_{i}" for i in range(members)]
+    config = {
+        "groupName": "Synthetic Group",
+        "jidMap": {str(i + 1): name for i, name in enumerate(names)},
+        "other": names[-1:] if members > 2 else [],
+        "excludeOther": False,
+        "senderAliases": {name: [f"nick{i}", f"49170{i:07d}"] for i, name in enumerate(names)},
+    }
+
+    # Few members write most of the messages.
+    activity = 1 / np.arange(1, members + 1) ** 0.8
+    senders = rng.choice(members, rows, p=activity / activity.sum()) + 1
+    start = int(pd.Timestamp("2015-01-01").timestamp() * 1000)
+    timestamps = start + np.sort(rng.integers(0, years * 365 * 24 * 3600 * 1000, rows))
+    types = rng.choice(list(message_types), rows, p=np.array(list(message_types.values())) / sum(message_types.values()))
+
+    lengths = 1 + rng.poisson(4, rows)
+    n_tokens = lengths.sum()
+    tokens = np.where(
+        rng.random(n_tokens) < emoji_rate,
+        np.array(EMOJIS, dtype=object)[rng.integers(len(EMOJIS), size=n_tokens)],
+        np.array(WORDS, dtype=object)[rng.integers(len(WORDS), size=n_tokens)],
+    ).tolist()
+    bounds = np.cumsum(lengths).tolist()
+    texts = pd.Series([" ".join(tokens[stop - length:stop]) for stop, length in zip(bounds, lengths.tolist())], dtype=object)
+
+    mentioned = [*names, *(alias for aliases in config["senderAliases"].values() for alias in aliases)]
+    mentions = rng.random(rows) < mention_rate
+    texts[mentions] = np.array(mentioned, dtype=object)[rng.integers(len(mentioned), size=mentions.sum())] + " " + texts[mentions]
+    links = rng.random(rows) < link_rate
+    texts[links] += " https://example.com/" + pd.Series(rng.integers(1_000_000, size=rows), dtype=str)[links]
+    texts[types != 0] = np.nan
+
+    df = pd.DataFrame({
+        "_id": np.arange(rows),
+        "chat_row_id": CHAT_ROW_ID,
+        "from_me": 0,
+        "key_id": "S" + pd.Series(np.arange(rows)).astype(str),
+        "sender_jid_row_id": senders,
+        "status": 0,
+        "broadcast": 0,
+        "recipient_count": 0,
+        "participant_hash": np.nan,
+        "origination_flags": 0,
+        "origin": 0,
+        "timestamp": timestamps,
+        "received_timestamp": timestamps,
+        "receipt_server_timestamp": timestamps,
+        "message_type": types,
+        "text_data": texts,
+        "starred": 0,
+        "lookup_tables": 0,
+        "message_add_on_flags": 0,
+        "sort_id": np.arange(rows),
+        "view_mode": 0,
+        "translated_text": np.nan,
+    }, columns=EXPORT_COLUMNS)
+
+    if sentiments:
+        scores = np.where(types == 0, rng.uniform(-1, 1, rows), 0)
+        df = df.assign(sentiment=label_scores(scores), score=scores)
+
+    return df, config
+
+
+def write_synthetic_export(directory: str, rows: int, **options) -> tuple[str, dict]:
+    # group-chat.csv and config.json in `directory`, as expected by prepare_data and dashboard.py.
+    df, config = synthetic_export(rows, **options)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "group-chat.csv")
+    df.to_csv(path, index=False)
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+
+    return path, config
+
+
+def write_synthetic_msgstore(path: str, export_path: str) -> str:
+    # The message and jid tables of a msgstore.db as read by data.read_msgstore, holding the
+    # messages of a synthetic group-chat.csv.
+    df = pd.read_csv(export_path, usecols=["chat_row_id", "sender_jid_row_id", "timestamp", "message_type", "text_data", "sort_id"])
+    with closing(sqlite3.connect(path)) as connection:
+        df.to_sql("message", connection, index=False)
+        connection.execute("CREATE INDEX message_chat_sort ON message (chat_row_id, sort_id)")
+        senders = pd.unique(df["sender_jid_row_id"].astype(int))
+        pd.DataFrame({"_id": senders, "user": [f"4917{sender:08d}" for sender in senders]}).to_sql("jid", connection, index=False)
+        connection.commit()
+
+    return path
+
+
+def legacy_emoji_counts(df: pd.DataFrame) -> pd.Series:
+    emojis = df["text_data"].apply(lambda text: [match["emoji"] for match in emoji.emoji_list(str(text))])
+    return emojis.groupby(df["sender_name"], observed=True).apply(lambda lists: sum(lists, []))
+
+
+def rescore_sentiments(bench, n_jobs: int):
+    # A fresh checkpoint every run, otherwise only the first run would score anything.
+    with tempfile.TemporaryDirectory() as cache_dir:
+        get_message_sentiments(bench.df, os.path.join(cache_dir, "out.csv"), "english", n_jobs, cache_dir=cache_dir)
+
+
+def benchmark_cases(n_jobs: int) -> dict:
+    # Functions timed at every size, each gets the chat being benchmarked.
+    return {
+        "data.read_chat_csv": lambda bench: data.read_chat_csv(bench.path),
+        "data.read_msgstore": lambda bench: data.read_msgstore(bench.msgstore, CHAT_ROW_ID),
+        "data.prepare_data": lambda bench: data.prepare_data(bench.config, bench.path, use_cache=False, n_jobs=n_jobs),
+        "ChatAggregates.from_frame": lambda bench: ChatAggregates.from_frame(bench.df, bench.config["senderAliases"], n_jobs),
+
+        "data.message_count": lambda bench: data.message_count(bench.chat),
+        "data.message_activity_stack": lambda bench: data.message_activity_stack(bench.chat),
+        "data.average_message_length": lambda bench: data.average_message_length(bench.chat),
+        "data.message_activity": lambda bench: data.message_activity(bench.chat),
+        "data.message_activity(users=*)": lambda bench: data.message_activity(bench.chat, users="*"),
+        "data.activity_series": lambda bench: data.activity_series(bench.chat, top_n=10),
+        "data.activity_series(week)": lambda bench: data.activity_series(bench.chat, "week", top_n=10),
+        "data.activity_series(day)": lambda bench: data.activity_series(bench.chat, "day", top_n=10),
+        "data.weekly_activity": lambda bench: data.weekly_activity(bench.chat),
+        "data.weekly_activity(user)": lambda bench: data.weekly_activity(bench.chat, bench.user),
+        "data.top_emojis": lambda bench: data.top_emojis(bench.chat),
+        "data.emoji_density": lambda bench: data.emoji_density(bench.chat),
+        "data.sentiment_counts": lambda bench: data.sentiment_counts(bench.chat),
+        "data.monthly_sentiment_score": lambda bench: data.monthly_sentiment_score(bench.chat),
+        "data.monthly_sentiment_score(average)": lambda bench: data.monthly_sentiment_score(bench.chat, average=True),
+        "data.monthly_sentiment_score(ema)": lambda bench: data.monthly_sentiment_score(bench.chat, top_n=10, trend="ema"),
+        "data.count_link_messages": lambda bench: data.count_link_messages(bench.chat),
+        "data.mention_matrices": lambda bench: data.mention_matrices(bench.chat),
+        "data.count_mentions": lambda bench: data.count_mentions(bench.chat),
+        "data.count_mentions(direct)": lambda bench: data.count_mentions(bench.chat, True),
+        "data.message_type_distribution": lambda bench: data.message_type_distribution(bench.chat),
+        "data.activity_heatmap(user)": lambda bench: data.activity_heatmap(bench.chat, bench.user),
+        "data.reply_latency": lambda bench: data.reply_latency(bench.chat, top_n=10),
+        "data.reply_matrix": lambda bench: data.reply_matrix(bench.chat),
+        "data.conversation_sessions": lambda bench: data.conversation_sessions(bench.chat),
+        "data.conversation_starters": lambda bench: data.conversation_starters(bench.chat),
+
+        "plots.plot_message_count_pie": lambda bench: plots.plot_message_count_pie(bench.chat),
+        "plots.plot_message_count_bar": lambda bench: plots.plot_message_count_bar(bench.chat),
+        "plots.plot_average_message_length": lambda bench: plots.plot_average_message_length(bench.chat),
+        "plots.plot_monthly_activity": lambda bench: plots.plot_monthly_activity(bench.chat),
+        "plots.plot_monthly_activity(week)": lambda bench: plots.plot_monthly_activity(bench.chat, "week"),
+        "plots.plot_monthly_activity(day)": lambda bench: plots.plot_monthly_activity(bench.chat, "day"),
+        "plots.plot_monthly_activity_stacked": lambda bench: plots.plot_monthly_activity_stacked(bench.chat),
+        "plots.plot_monthly_activity_stacked(week)": lambda bench: plots.plot_monthly_activity_stacked(bench.chat, "week"),
+        "plots.plot_monthly_activity_stacked(day)": lambda bench: plots.plot_monthly_activity_stacked(bench.chat, "day"),
+        "plots.plot_weekly_activity_group": lambda bench: plots.plot_weekly_activity_group(bench.chat),
+        "plots.plot_sentiment_ratios": lambda bench: plots.plot_sentiment_ratios(bench.chat),
+        "plots.plot_emoji_density": lambda bench: plots.plot_emoji_density(bench.chat),
+        "plots.plot_mentions_heatmap": lambda bench: plots.plot_mentions_heatmap(bench.chat),
+        "plots.plot_direct_mentions_heatmap": lambda bench: plots.plot_direct_mentions_heatmap(bench.chat),
+        "plots.plot_message_type_distribution": lambda bench: plots.plot_message_type_distribution(bench.chat, "image", "Images"),
+        "plots.plot_link_distribution": lambda bench: plots.plot_link_distribution(bench.chat),
+        "plots.plot_monthly_sentiment_line": lambda bench: plots.plot_monthly_sentiment_line(bench.chat),
+        "plots.plot_user_weekly_activity": lambda bench: plots.plot_user_weekly_activity(bench.chat, bench.user),
+        "plots.plot_activity_heatmap": lambda bench: plots.plot_activity_heatmap(bench.chat, bench.user),
+        "plots.plot_reply_latency": lambda bench: plots.plot_reply_latency(bench.chat),
+        "plots.plot_reply_matrix": lambda bench: plots.plot_reply_matrix(bench.chat),
+        "plots.plot_conversation_sessions": lambda bench: plots.plot_conversation_sessions(bench.chat),
+        "plots.plot_conversation_starters": lambda bench: plots.plot_conversation_starters(bench.chat),
+
+        "sentiment_analysis.get_message_sentiments": lambda bench: rescore_sentiments(bench, n_jobs),
+        "emoji.emoji_list (legacy)": lambda bench: legacy_emoji_counts(bench.df),
+    }
+
+
+def measure(fn, bench, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(bench)
+        times.append(time.perf_counter() - start)
+
+    # Traced in a run of its own, tracing slows allocations down. Memory of worker
+    # processes is not included.
+    tracemalloc.start()
+    try:
+        fn(bench)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": min(times), "mean_seconds": sum(times) / len(times), "peak_bytes": peak}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: list[int], cases: dict, repeat: int, options: dict) -> list[dict]:
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path, config = write_synthetic_export(directory, rows, **options)
+            df = data.prepare_data(config, path, use_cache=False)
+            chat = ChatAggregates.from_frame(df, config["senderAliases"])
+            bench = SimpleNamespace(path=path, config=config, df=df, chat=chat, user=chat.senders[0], msgstore=None)
+            if any("msgstore" in case for case in cases):
+                bench.msgstore = write_synthetic_msgstore(os.path.join(directory, "msgstore.db"), path)
+
+            for case, fn in cases.items():
+                result = {"case": case, "rows": rows, **measure(fn, bench, repeat)}
+                print(f"{rows:>12,}  {case:<45} {result['seconds'] * 1000:>11.1f} ms {result['peak_bytes'] / 2**20:>10.1f} MiB", flush=True)
+                results.append(result)
+
+    return results
+
+
+def startup_phases(directory: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, os.path.dirname(os.path.abspath(__file__))],
+        cwd=directory, capture_output=True, text=True, check=True,
+    )
+    # Lines of other output (e.g. the metrics table with METRICS set) are skipped.
+    return {name: measured for line in result.stdout.splitlines() if line.startswith("{") for name, measured in json.loads(line).items()}
+
+
+def run_startup(sizes: list[int], repeat: int, options: dict) -> list[dict]:
+    # Import time and time to ready of the dashboard: cold prepares the chat, cached loads
+    # what the cold start left in data/.cache. The forked worker is what every further
+    # gunicorn worker costs with the warm-up done in the master.
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            write_synthetic_export(os.path.join(directory, "data"), rows, **options)
+            runs = {}
+            for _ in range(repeat):
+                shutil.rmtree(os.path.join(directory, "data", ".cache"), ignore_errors=True)
+                for start in ("cold", "cached"):
+                    for name, measured in startup_phases(directory).items():
+                        runs.setdefault(f"dashboard.startup {name} ({start})", []).append(measured)
+
+            for case, measured in runs.items():
+                times = [run["seconds"] for run in measured]
+                result = {"case": case, "rows": rows, "seconds": min(times), "mean_seconds": sum(times) / len(times), "peak_bytes": max(run["peak_bytes"] for run in measured)}
+                print(f"{rows:>12,}  {case:<45} {result['seconds'] * 1000:>11.1f} ms {result['peak_bytes'] / 2**20:>10.1f} MiB", flush=True)
+                results.append(result)
+
+    return results
+
+
+def compare(old: dict, new: dict, tolerance: float) -> list[dict]:
+    # Cases that got slower or use more memory than `tolerance` times the old run.
+    regressions = []
+    old_results = {(result["case"], result["rows"]): result for result in old["results"]}
+
+    print(f"\nCompared to {old.get('commit')} from {old.get('started')}:")
+    for result in new["results"]:
+        before = old_results.get((result["case"], result["rows"]))
+        if not before:
+            continue
+
+        time_ratio = result["seconds"] / max(before["seconds"], 1e-9)
+        memory_ratio = result["peak_bytes"] / max(before["peak_bytes"], 1)
+        regressed = time_ratio > tolerance or memory_ratio > tolerance
+        print(f"{result['rows']:>12,}  {result['case']:<45} time x{time_ratio:>6.2f}  memory x{memory_ratio:>6.2f}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(result)
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile the data preparation, aggregations and plots on synthetic chats.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Numbers of synthetic messages to benchmark")
+    parser.add_argument("--only", type=str, nargs="+", default=None, help="Only run cases whose name contains one of these")
+    parser.add_argument("--skip", type=str, nargs="+", default=["legacy"], help="Skip cases whose name contains one of these")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case, the fastest is reported")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes for the functions that can use several")
+    parser.add_argument("--members", type=int, default=8, help="Number of group members")
+    parser.add_argument("--emoji-rate", type=float, default=0.1, help="Share of emojis among the words of a message")
+    parser.add_argument("--link-rate", type=float, default=0.03, help="Share of text messages with a link")
+    parser.add_argument("--mention-rate", type=float, default=0.05, help="Share of text messages mentioning a member or alias")
+    parser.add_argument("--message-types", type=json.loads, default=None, help="JSON object of message type shares, e.g. '{\"0\": 0.9, \"1\": 0.1}'")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic chats")
+    parser.add_argument("--output", type=str, default=None, help="Results file, by default a new file in ./benchmarks")
+    parser.add_argument("--compare", type=str, default=None, help="Results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Slowdown or memory growth reported as regression by --compare")
+    parser.add_argument("--startup", action="store_true", help="Only time the import and warm-up of the dashboard and a worker forked from it, in fresh processes")
+    parser.add_argument("--export", type=str, default=None, help="Only write a synthetic group-chat.csv and config.json of the first size to this directory")
+
+    args = parser.parse_args()
+
+    options = {
+        "members": args.members,
+        "emoji_rate": args.emoji_rate,
+        "link_rate": args.link_rate,
+        "mention_rate": args.mention_rate,
+        "message_types": {int(t): share for t, share in args.message_types.items()} if args.message_types else None,
+        "seed": args.seed,
+    }
+
+    if args.export:
+        path, _ = write_synthetic_export(args.export, args.sizes[0], **options)
+        print(f"Wrote {args.sizes[0]:,} messages to {path}")
+        sys.exit()
+
+    cases = {
+        case: fn for case, fn in benchmark_cases(args.workers).items()
+        if (not args.only or any(name in case for name in args.only)) and not any(name in case for name in args.skip)
+    }
+
+    started = datetime.now(timezone.utc)
+    report = {
+        "commit": git_commit(),
+        "started": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": default_workers(),
+        "settings": {**vars(args), **options},
+        "results": run_startup(args.sizes, args.repeat, options) if args.startup else run_suite(args.sizes, cases, args.repeat, options),
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{started:%Y%m%d-%H%M%S}-{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        sys.exit(1 if regressions else 0)
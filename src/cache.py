@@ -0,0 +1,70 @@
+import glob
+import hashlib
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+CACHE_DIR = "./data/.cache"
+SAMPLE_SIZE = 1 << 20
+
+# Part of every cache key, bump it whenever prepare_data changes the columns it produces.
+CACHE_VERSION = 3
+
+
+def fingerprint(path: str, config: dict) -> str:
+    # Size and mtime catch almost every change, the sampled content hash guards against
+    # copies that reset the mtime without reading the whole (possibly multi-GB) file.
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{CACHE_VERSION}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    digest.update(json.dumps(config, sort_keys=True).encode())
+
+    with open(path, "rb") as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        if stat.st_size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, stat.st_size - SAMPLE_SIZE))
+            digest.update(f.read(SAMPLE_SIZE))
+
+    return digest.hexdigest()
+
+
+def cache_path(path: str, config: dict, cache_dir: str = None) -> str:
+    # Next to the chat by default, chats of different groups may share a file name.
+    cache_dir = cache_dir or os.path.join(os.path.dirname(path) or ".", ".cache")
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{fingerprint(path, config)}.feather")
+
+
+def text_features_path(path: str, cache_dir: str = None) -> str:
+    # One table for all exports of the chats in a folder, keyed by text rather than file.
+    cache_dir = cache_dir or os.path.join(os.path.dirname(path) or ".", ".cache")
+    return os.path.join(cache_dir, f"text-features-v{CACHE_VERSION}.feather")
+
+
+def arrow_dtype(arrow_type: pa.DataType) -> pd.ArrowDtype | None:
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) or pa.types.is_list(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def read_cache(path: str) -> pd.DataFrame | None:
+    if not os.path.exists(path):
+        return None
+    # Texts and emoji lists stay Arrow arrays on the mapped file instead of becoming objects.
+    return feather.read_table(path, memory_map=True).to_pandas(types_mapper=arrow_dtype, ignore_metadata=True)
+
+
+def write_cache(df: pd.DataFrame, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Older snapshots of the same chat are stale once a new fingerprint is written.
+    prefix = os.path.basename(path).rsplit("-", 1)[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{prefix}-{'?' * 32}.feather")):
+        os.remove(stale)
+
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
@@ -1,6 +1,15 @@
+import os
+import threading
 import dash
-from dash import html, dcc, Input, Output, dash_table
-from data import message_count, prepare_data, top_emojis
+import flask
+from functools import partial
+from dash import html, dcc, Input, Output, State, dash_table
+from background import background_manager
+from data import message_count, top_emojis
+from figure_cache import FigureCache
+from groups import DEFAULT_POOL_BYTES, GroupPool, find_groups, load_group
+from instrumentation import ENABLED as METRICS_ENABLED, instrumented, measure, metrics
+from live import LiveChat
 from plots import (
     plot_message_count_pie,
     plot_message_count_bar,
@@ -15,27 +24,70 @@ from plots import (
     plot_direct_mentions_heatmap,
     plot_message_type_distribution,
     plot_link_distribution,
-    plot_monthly_sentiment_line
+    plot_monthly_sentiment_line,
+    plot_activity_heatmap,
+    plot_reply_latency,
+    plot_reply_matrix,
+    plot_conversation_sessions,
+    plot_conversation_starters
 )
 from utils import load_json
 
 
-CONFIG = load_json("./data/config.json")
+# Serialized figures of the current data version of every loaded group.
+figures = FigureCache()
 
-group_name = CONFIG["groupName"]
+# One group per directory in data/groups served under /<group>, otherwise the single chat
+# configured in data/config.json.
+group_dirs = find_groups()
+if group_dirs:
+    loaders = {name: partial(load_group, group_dir) for name, group_dir in group_dirs.items()}
+else:
+    loaders = {"": lambda: LiveChat(load_json("./data/config.json"))}
 
-wa_df = prepare_data(CONFIG)
+pool = GroupPool(
+    loaders,
+    max_bytes=int(os.environ.get("GROUP_POOL_MB", DEFAULT_POOL_BYTES >> 20)) << 20,
+    on_evict=lambda live_chat: figures.forget(live_chat.chat.token),
+)
+
+# The first group is loaded by warm_up before serving, the others on their first request.
+default_group = pool.names[0]
+
+
+def reset_locks():
+    # Background callbacks run in processes forked from the threaded server, a lock held
+    # by another thread at the time of the fork would never be released in there.
+    figures.lock = threading.Lock()
+    metrics.lock = threading.Lock()
+    pool.lock = threading.Lock()
+    pool.loading = {name: threading.Lock() for name in pool.loaders}
+    for live_chat in pool.chats.values():
+        live_chat.lock = threading.Lock()
 
-contains_sentiments = "sentiment" in wa_df.columns and "score" in wa_df.columns
 
-app = dash.Dash(__name__)
+os.register_at_fork(after_in_child=reset_locks)
+
+# Sections below the first one only exist once their callback has rendered them. The
+# callbacks of the dropdowns compute their figures in background processes.
+app = dash.Dash(__name__, suppress_callback_exceptions=True, background_callback_manager=background_manager(figures=figures))
 app.title = f"WhatsApp Group Analyzed"
 
-user_message_counts = message_count(wa_df.copy())
-top_3_most_messages = user_message_counts["sender_name"].tolist()[:3]
 
-user_selections = [{"label": user, "value": user} for user in sorted(wa_df["sender_name"].dropna().unique())]
-emoji_df = top_emojis(wa_df.copy(), top_n=3)
+if METRICS_ENABLED:
+    @app.server.route("/metrics")
+    def serve_metrics():
+        # Prometheus text format, ?format=json for the raw totals.
+        if flask.request.args.get("format") == "json":
+            return flask.Response(metrics.json(), mimetype="application/json")
+
+        gauges = {
+            "figure_cache_hits": figures.hits,
+            "figure_cache_misses": figures.misses,
+            "figure_cache_bytes": figures.size,
+            "loaded_groups": len(pool.chats),
+        }
+        return flask.Response(metrics.prometheus(gauges), mimetype="text/plain; version=0.0.4")
 
 style_section = {
     "backgroundColor": "#f0f0f0",
@@ -44,11 +96,10 @@ style_section = {
     "marginBottom": "20px"
 }
 
-image_dist_plot, top_image_sender = plot_message_type_distribution(wa_df.copy(), "image", "Images")
-sticker_dist_plot, top_sticker_sender = plot_message_type_distribution(wa_df.copy(), "sticker", "Stickers")
-map_dist_plot, top_map_sender = plot_message_type_distribution(wa_df.copy(), "map", "Maps")
-deleted_dist_plot, top_deleted_sender = plot_message_type_distribution(wa_df.copy(), "deleted", "Deleted")
-link_dist_plot, top_link_sender = plot_link_distribution(wa_df.copy())
+graph_style = {"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}
+
+visible = {"display": "block", "margin": "10px auto"}
+hidden = {"display": "none"}
 
 
 def section(children, **style):
@@ -58,74 +109,88 @@ def flex_row(children):
     return html.Div(children, style={"display": "flex", "flexWrap": "wrap"})
 
 def render_medals(top_users):
-    return html.Div([
-        html.H3(f"🥇 {top_users[0]}"),
-        html.H3(f"🥈 {top_users[1]}"),
-        html.H3(f"🥉 {top_users[2]}"),
-    ], style={"display": "flex", "flexDirection": "row", "gap": "20px", "justifyContent": "center"})
+    return [html.H3(f"{medal} {user}") for medal, user in zip(["🥇", "🥈", "🥉"], top_users)]
 
 
-def render_media_row(fig, title, name, emoji):
-    return html.Div([
-        html.Div([
-            html.H2(f"{emoji} {title}: {name}"),
-        ], style={
-            "marginTop": "auto",
-            "marginBottom": "auto",
-            "padding": "10px",
-            "textAlign": "center",
-            "minWidth": "200px"
-        }),
-        dcc.Graph(figure=fig, style={"flex": 1, "flexGrow": 1, "height": "100%", "minWidth": "500px"})
-    ], style={
-        "display": "flex",
-        "flexDirection": "column",
-        "flex": 1,
-        "alignItems": "center"
-    })
+def graph(graph_id, figure, **style):
+    return dcc.Graph(id=graph_id, figure=figure, style={**graph_style, **style})
 
 
-app.layout = html.Div([
-    html.H1(f"🔎 {group_name} - Analyzed", style={**style_section}),
+def render_yappers(chat):
+    top_3_most_messages = message_count(chat)["sender_name"].tolist()[:3]
 
-    html.H2("👄 Biggest Yappers", style={**style_section}),    
-    section([
+    return [
         flex_row([
-            dcc.Graph(figure=plot_message_count_pie(wa_df.copy()), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}),
-            dcc.Graph(figure=plot_message_count_bar(wa_df.copy()), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}),
-            dcc.Graph(figure=plot_average_message_length(wa_df.copy()), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}),
+            graph("message-count-pie", figures(plot_message_count_pie, chat)),
+            graph("message-count-bar", figures(plot_message_count_bar, chat)),
+            graph("average-message-length", figures(plot_average_message_length, chat)),
         ]),
-        render_medals(top_3_most_messages)
-    ]),
-
-    html.H2("🖇️ Most Co-Dependent", style={**style_section}),
-    section(flex_row([
-        dcc.Graph(figure=plot_monthly_activity(wa_df.copy()), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}),
-        dcc.Graph(figure=plot_monthly_activity_stacked(wa_df.copy()), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}),
-    ])),
-    
-    section(flex_row([
-        dcc.Graph(figure=plot_weekly_activity_group(wa_df.copy()), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}),
-        html.Div([
-            dcc.Graph(id="weekly-activity-plot", style={"flexGrow": 1, "minWidth": "500px", "height": "100%", "width": "100%"}),
-            html.Div(dcc.Dropdown(
-                id="user-dropdown",
-                options=user_selections,
-                value=user_selections[0]["value"],
-                style={"width": "150px"}
-            ), style={"display": "flex", "justifyContent": "center"})
-        ], style={"flex": 1, "width": "50%", "margin": "auto", "display": "flex", "flexDirection": "column", "alignItems": "center"})
-    ])),
-    
-    section(flex_row([
-        dcc.Graph(figure=plot_mentions_heatmap(wa_df.copy(), alias_dict=CONFIG["senderAliases"]), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"}),
-        dcc.Graph(figure=plot_direct_mentions_heatmap(wa_df.copy(), alias_dict=CONFIG["senderAliases"]), style={"flex": 1, "flexGrow": 1, "minWidth": "500px", "height": "100%"})
-    ])),
-
-    html.H2("❤️ Pure Emotions", style={**style_section}),    
-    section([
+        html.Div(
+            render_medals(top_3_most_messages),
+            style={"display": "flex", "flexDirection": "row", "gap": "20px", "justifyContent": "center"},
+        )
+    ]
+
+
+def render_co_dependency(chat):
+    user_selections = [{"label": user, "value": user} for user in sorted(chat.senders)]
+
+    return [
+        section([
+            html.Div(dcc.RadioItems(
+                id="activity-granularity",
+                options=[{"label": label, "value": value} for value, label in [("month", "Months"), ("week", "Weeks"), ("day", "Days")]],
+                value="month",
+                inline=True,
+                inputStyle={"marginLeft": "15px", "marginRight": "5px"},
+            ), style={"display": "flex", "justifyContent": "center"}),
+            progress_bar("activity"),
+            flex_row([
+                dcc.Graph(id="monthly-activity", style=graph_style),
+                dcc.Graph(id="monthly-activity-stacked", style=graph_style),
+            ]),
+        ]),
+
+        section(flex_row([
+            graph("weekly-activity-group", figures(plot_weekly_activity_group, chat)),
+            html.Div([
+                dcc.Graph(id="weekly-activity-plot", style={"flexGrow": 1, "minWidth": "500px", "height": "100%", "width": "100%"}),
+                html.Div(dcc.Dropdown(
+                    id="user-dropdown",
+                    options=user_selections,
+                    value=user_selections[0]["value"],
+                    style={"width": "150px"}
+                ), style={"display": "flex", "justifyContent": "center"}),
+                progress_bar("weekly-activity"),
+            ], style={"flex": 1, "width": "50%", "margin": "auto", "display": "flex", "flexDirection": "column", "alignItems": "center"})
+        ])),
+
+        section(flex_row([
+            # Of the user selected in the dropdown above.
+            dcc.Graph(id="activity-heatmap", style=graph_style),
+            graph("reply-latency", figures(plot_reply_latency, chat)),
+        ])),
+
+        section(flex_row([
+            graph("mentions-heatmap", figures(plot_mentions_heatmap, chat)),
+            graph("direct-mentions-heatmap", figures(plot_direct_mentions_heatmap, chat))
+        ])),
+
+        section(flex_row([
+            graph("reply-matrix", figures(plot_reply_matrix, chat)),
+            graph("conversation-sessions", figures(plot_conversation_sessions, chat)),
+            graph("conversation-starters", figures(plot_conversation_starters, chat)),
+        ])),
+    ]
+
+
+def render_emotions(chat):
+    emoji_df = top_emojis(chat, top_n=3)
+
+    return section([
         flex_row([
             html.Div(dash_table.DataTable(
+                id="emoji-table",
                 data=emoji_df.to_dict("records"),
                 columns=[{"name": col, "id": col} for col in emoji_df.columns],
                 style_cell={"textAlign": "center", "fontSize": 22},
@@ -135,61 +200,335 @@ app.layout = html.Div([
                 page_action="none",
                 style_as_list_view=False,
             ), style={"flex": 1, "height": "100%", "minWidth": "500px"}),
-            html.Div(dcc.Graph(figure=plot_emoji_density(wa_df.copy())), style={"flex": 1, "flexGrow": 1, "height": "100%", "minWidth": "500px"}),
+            html.Div(dcc.Graph(id="emoji-density", figure=figures(plot_emoji_density, chat)), style={"flex": 1, "flexGrow": 1, "height": "100%", "minWidth": "500px"}),
         ]),
         html.Div([
-            dcc.Graph(figure=plot_sentiment_ratios(wa_df.copy())),
+            dcc.Graph(id="sentiment-ratios", figure=figures(plot_sentiment_ratios, chat)),
             dcc.Graph(id="monthly-sentiment-plot"),
             html.Div(dcc.Dropdown(
                 id="sentiment-mode-dropdown",
-                options=["all", "average"],
+                options=["all", "average", "trend"],
                 value="all",
                 style={"width": "150px"}
-            ), style={"display": "flex", "justifyContent": "center"})
-        ]) if contains_sentiments else None
-    ]),
- 
-    html.H2("📱 Multi Media", style={**style_section}),   
-    section([
-        flex_row([
-            render_media_row(image_dist_plot, "Meme Lord", top_image_sender, "🖼️"),
-            render_media_row(sticker_dist_plot, "Sticker Collector", top_sticker_sender, "🎫"),
-        ]),
-        flex_row([
-            render_media_row(map_dist_plot, "Navigator", top_map_sender, "🗺️"),
-            render_media_row(link_dist_plot, "Intel-Man", top_link_sender, "🔗"),
-        ]),
+            ), style={"display": "flex", "justifyContent": "center"}),
+            progress_bar("monthly-sentiment"),
+        ]) if chat.contains_sentiments else None
+    ])
+
+
+def render_media_row(name, figure, title):
+    return html.Div([
+        html.Div([
+            html.H2(title),
+        ], style={
+            "marginTop": "auto",
+            "marginBottom": "auto",
+            "padding": "10px",
+            "textAlign": "center",
+            "minWidth": "200px"
+        }),
+        graph(f"{name}-distribution", figure)
+    ], style={
+        "display": "flex",
+        "flexDirection": "column",
+        "flex": 1,
+        "alignItems": "center"
+    })
+
+
+def render_media(chat):
+    media = {
+        "image": (*figures(plot_message_type_distribution, chat, "image", "Images"), "Meme Lord", "🖼️"),
+        "sticker": (*figures(plot_message_type_distribution, chat, "sticker", "Stickers"), "Sticker Collector", "🎫"),
+        "map": (*figures(plot_message_type_distribution, chat, "map", "Maps"), "Navigator", "🗺️"),
+        "link": (*figures(plot_link_distribution, chat), "Intel-Man", "🔗"),
+        "deleted": (*figures(plot_message_type_distribution, chat, "deleted", "Deleted"), "Retractor", "❌"),
+    }
+    rows = {
+        name: render_media_row(name, fig, f"{emoji} {title}: {top_sender}" if top_sender else f"{emoji} {title}")
+        for name, (fig, top_sender, title, emoji) in media.items()
+    }
+
+    return section([
+        flex_row([rows["image"], rows["sticker"]]),
+        flex_row([rows["map"], rows["link"]]),
         flex_row([
-            render_media_row(deleted_dist_plot, "Retractor", top_deleted_sender, "❌"),
+            rows["deleted"],
             html.Div()  # Empty block for alignment (since odd number)
         ]),
     ])
 
+
+# Rendered after the first paint by one callback each, the browser requests them in parallel.
+lazy_sections = {
+    "co-dependency": render_co_dependency,
+    "emotions": render_emotions,
+    "media": render_media,
+}
+
+
+def lazy_section(name):
+    return dcc.Loading(html.Div(id=f"{name}-section", style={"minHeight": "200px"}), type="circle")
+
+
+def render_filters(chat):
+    # Months are selected by their index, labeled with the year wherever a new one starts.
+    last = max(len(chat.months) - 1, 0)
+    marks = {i: month[:4] for i, month in enumerate(chat.months) if i == 0 or month[:4] != chat.months[i - 1][:4]}
+
+    return section(flex_row([
+        html.Div(dcc.RangeSlider(
+            id="month-range",
+            min=0,
+            max=last,
+            step=1,
+            value=[0, last],
+            marks=marks,
+            allowCross=False,
+        ), style={"flex": 1, "minWidth": "500px"}),
+        dcc.Dropdown(
+            id="sender-filter",
+            options=sorted(chat.senders),
+            multi=True,
+            placeholder="All senders",
+            style={"width": "300px"}
+        ),
+    ]))
+
+
+def selected_chat(group, month_range, senders, months):
+    # A slider at either end is open ended, so the selection grows with refreshed messages.
+    chat = pool.get(group).chat
+    first, last = month_range or (0, len(months) - 1)
+    return chat.select(
+        start=months[first] if first > 0 else None,
+        end=months[last] if last < len(months) - 1 else None,
+        senders=senders or None,
+    )
+
+
+def data_version(live_chat):
+    # Part of the arguments of every callback, so that the results of background callbacks
+    # are shared only for the same data. A reloaded chat starts counting versions anew.
+    return [live_chat.chat.token, live_chat.version]
+
+
+def progress_bar(name):
+    return html.Progress(id=f"{name}-progress", value=0, max=1, style=hidden)
+
+
+def background_callback(name):
+    # Options of a callback computed in a background process, its progress bar is only
+    # shown meanwhile. Leaving the page cancels the job, a new value of the same inputs
+    # already replaces it.
+    return dict(
+        background=True,
+        progress=[Output(f"{name}-progress", "value"), Output(f"{name}-progress", "max")],
+        running=[(Output(f"{name}-progress", "style"), visible, hidden)],
+        cancel=[Input("url", "pathname")],
+    )
+
+
+def group_from_path(pathname):
+    if not group_dirs:
+        return default_group
+    return app.strip_relative_path(pathname) or default_group
+
+
+def render_group_selector(name):
+    return html.Div(dcc.Dropdown(
+        id="group-dropdown",
+        options=pool.names,
+        value=name,
+        clearable=False,
+        style={"width": "250px"}
+    ), style={"display": "flex", "justifyContent": "flex-end", "marginBottom": "20px"})
+
+
+app.layout = html.Div([
+    dcc.Location(id="url", refresh="callback-nav"),
+    html.Div(id="page"),
 ], style={"margin": "25px"})
 
 
 @app.callback(
-    Output("weekly-activity-plot", "figure"),
-    Input("user-dropdown", "value")
+    Output("page", "children"),
+    Input("url", "pathname")
+)
+@instrumented
+def render_page(pathname):
+    # Only the first section is computed before the page is sent.
+    name = group_from_path(pathname)
+    if name not in pool.loaders:
+        return html.H1(f"🤷 No group named {name}", style={**style_section})
+
+    live_chat = pool.get(name)
+    refresh_seconds = live_chat.config.get("refreshSeconds")
+
+    return [
+        dcc.Store(id="group-name", data=name),
+        dcc.Store(id="data-version", data=data_version(live_chat)),
+        dcc.Store(id="filter-months", data=live_chat.chat.months),
+        # Seconds between checks for new messages in the export, no refresh when missing.
+        dcc.Interval(id="refresh-interval", interval=refresh_seconds * 1000) if refresh_seconds else None,
+
+        render_group_selector(name) if group_dirs else None,
+
+        html.H1(f"🔎 {live_chat.config['groupName']} - Analyzed", style={**style_section}),
+        render_filters(live_chat.chat),
+
+        html.H2("👄 Biggest Yappers", style={**style_section}),
+        section(html.Div(render_yappers(live_chat.chat), id="yappers-section")),
+
+        html.H2("🖇️ Most Co-Dependent", style={**style_section}),
+        lazy_section("co-dependency"),
+
+        html.H2("❤️ Pure Emotions", style={**style_section}),
+        lazy_section("emotions"),
+
+        html.H2("📱 Multi Media", style={**style_section}),
+        lazy_section("media"),
+    ]
+
+
+@app.callback(
+    Output("url", "pathname"),
+    Input("group-dropdown", "value"),
+    prevent_initial_call=True
 )
-def update_weekly_activity(selected_user):
-    return plot_user_weekly_activity(wa_df.copy(), user=selected_user)
+@instrumented
+def select_group(name):
+    return app.get_relative_path(f"/{name}")
 
 
-if contains_sentiments:
+def register_section(name, render, prevent_initial_call=False):
     @app.callback(
-        Output("monthly-sentiment-plot", "figure"),
-        Input("sentiment-mode-dropdown", "value")
+        Output(f"{name}-section", "children"),
+        Input("data-version", "data"),
+        Input("month-range", "value"),
+        Input("sender-filter", "value"),
+        State("group-name", "data"),
+        State("filter-months", "data"),
+        prevent_initial_call=prevent_initial_call
     )
-    def update_monthly_sentiment(mode):
-        return plot_monthly_sentiment_line(wa_df.copy(), average=(mode == "average"))
+    @instrumented(name=f"dashboard.update_section[{name}]")
+    def update_section(version, month_range, senders, group, months):
+        chat = selected_chat(group, month_range, senders, months)
+        if not chat.message_counts.any():
+            return html.H3("🤷 No messages in this selection")
+        return render(chat)
+
 
+# The first section comes with the page and only needs rendering again after a refresh.
+register_section("yappers", render_yappers, prevent_initial_call=True)
+for name, render in lazy_sections.items():
+    register_section(name, render)
+
+
+@app.callback(
+    Output("weekly-activity-plot", "figure"),
+    Output("activity-heatmap", "figure"),
+    Input("user-dropdown", "value"),
+    Input("data-version", "data"),
+    Input("month-range", "value"),
+    Input("sender-filter", "value"),
+    State("group-name", "data"),
+    State("filter-months", "data"),
+    **background_callback("weekly-activity")
+)
+@instrumented
+def update_weekly_activity(set_progress, selected_user, version=None, month_range=None, senders=None, group=default_group, months=None):
+    chat = selected_chat(group, month_range, senders, months or [])
+    # The section renders the dropdown anew when the user is filtered out.
+    if selected_user not in chat.sender_index:
+        return dash.no_update, dash.no_update
+    set_progress((0, 2))
+    weekly = figures(plot_user_weekly_activity, chat, user=selected_user)
+    set_progress((1, 2))
+    return weekly, figures(plot_activity_heatmap, chat, user=selected_user)
+
+
+@app.callback(
+    Output("monthly-activity", "figure"),
+    Output("monthly-activity-stacked", "figure"),
+    Input("activity-granularity", "value"),
+    Input("data-version", "data"),
+    Input("month-range", "value"),
+    Input("sender-filter", "value"),
+    State("group-name", "data"),
+    State("filter-months", "data"),
+    **background_callback("activity")
+)
+@instrumented
+def update_activity(set_progress, granularity, version=None, month_range=None, senders=None, group=default_group, months=None):
+    chat = selected_chat(group, month_range, senders, months or [])
+    if not chat.message_counts.any():
+        return dash.no_update, dash.no_update
+    set_progress((0, 2))
+    lines = figures(plot_monthly_activity, chat, granularity)
+    set_progress((1, 2))
+    return lines, figures(plot_monthly_activity_stacked, chat, granularity)
+
+
+@app.callback(
+    Output("monthly-sentiment-plot", "figure"),
+    Input("sentiment-mode-dropdown", "value"),
+    Input("data-version", "data"),
+    Input("month-range", "value"),
+    Input("sender-filter", "value"),
+    State("group-name", "data"),
+    State("filter-months", "data"),
+    **background_callback("monthly-sentiment")
+)
+@instrumented
+def update_monthly_sentiment(set_progress, mode, version=None, month_range=None, senders=None, group=default_group, months=None):
+    chat = selected_chat(group, month_range, senders, months or [])
+    set_progress((0, 1))
+    return figures(plot_monthly_sentiment_line, chat, average=(mode == "average"), trend=("ema" if mode == "trend" else None))
+
+
+@app.callback(
+    Output("data-version", "data"),
+    Input("refresh-interval", "n_intervals"),
+    State("group-name", "data"),
+    State("data-version", "data"),
+    prevent_initial_call=True
+)
+@instrumented
+def refresh_data(n_intervals, group, version):
+    # The messages may also have been read by the refresh of another open page.
+    live_chat = pool.get(group)
+    live_chat.refresh()
+    current = data_version(live_chat)
+    return current if current != version else dash.no_update
+
+
+def live_refresh() -> bool:
+    # Whether the page of any group polls its export for new messages.
+    configs = [load_json(os.path.join(group_dir, "config.json")) for group_dir in group_dirs.values()] if group_dirs else [load_json("./data/config.json")]
+    return any(config.get("refreshSeconds") for config in configs)
+
+
+def warm_up():
+    # Loads the first group and renders its page once, so that the first request finds
+    # the data and figures ready. Runs once per server: under gunicorn in the master before
+    # it forks the workers (see wsgi.py), which then share all of it copy-on-write.
+    with measure("dashboard.startup"):
+        chat = pool.get(default_group).chat
+        for render in (render_yappers, *lazy_sections.values()):
+            render(chat)
+
+    if METRICS_ENABLED:
+        print(metrics.table(), flush=True)
 
 
 if __name__ == "__main__":
-    import os
-    
-    if os.environ.get("ENV", "dev") == "dev":
+    debug = os.environ.get("ENV", "dev") == "dev"
+    # The reloader of debug mode serves from a child process, only that one warms up.
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up()
+
+    if debug:
         app.run(debug=True)
     else:
         app.run(host="0.0.0.0")
@@ -1,99 +1,157 @@
-import re
+import sqlite3
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from collections import Counter
-from utils import MESSAGE_TYPE_MAP, extract_emojis
+from contextlib import closing
+from aggregates import LATENCY_LABELS, MESSAGE_TYPES, ChatAggregates
+from cache import cache_path, read_cache, text_features_path, write_cache
+from instrumentation import instrumented
+from sentiment_aggregates import METRICS, TRENDS, negative_share, positive_share
+from text_features import TextFeatures
 
 
-def message_count(df: pd.DataFrame) -> pd.DataFrame:
-    counts = df["sender_name"].value_counts().sort_values(ascending=False)
-    return counts.reset_index().rename(columns={"index": "sender_name", "count": "count"})
+SENTIMENT_COLUMNS = ["sentiment", "score"]
 
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
-def message_activity_stack(df: pd.DataFrame) -> pd.DataFrame:
-    df["timestamp"] = pd.to_datetime(df["timestamp"] / 1000, unit="s")
-    df["month_year"] = df["timestamp"].dt.to_period("M").astype(str)
-    
-    df = df.groupby(["month_year", "sender_name"]).size().unstack(fill_value=0).sort_index()
-    return df.reset_index().melt(id_vars="month_year", var_name="user", value_name="message_count")
+# Users beyond the most active ones in the time series plots.
+REST = "Rest"
+
+# Texts and emoji lists of all messages are each one Arrow buffer of UTF-8 bytes with
+# offsets, instead of a Python object per message.
+TEXT_DTYPE = pd.ArrowDtype(pa.large_string())
 
 
-def average_message_length(df: pd.DataFrame) -> pd.DataFrame:
-    df["message_length"] = df["text_data"].apply(lambda x: len(str(x)))
+@instrumented
+def message_count(chat: ChatAggregates) -> pd.DataFrame:
+    counts = chat.sender_series(chat.message_counts.sum(axis=1), "count")
+    return counts.sort_values(ascending=False, kind="stable").reset_index()
 
-    average_message_length = df.groupby("sender_name")["message_length"].mean()
-    return average_message_length.sort_values(ascending=False).reset_index().rename(columns={"index": "sender_name", "length": "length"})
+
+@instrumented
+def message_activity_stack(chat: ChatAggregates) -> pd.DataFrame:
+    counts = chat.sender_month_frame(chat.message_counts)
+    df = counts.loc[:, counts.sum() > 0].T
+    return df.reset_index().melt(id_vars="month_year", var_name="user", value_name="message_count")
 
 
-def message_activity(df: pd.DataFrame, users: list[str] = None) -> pd.DataFrame:
-    df["timestamp"] = pd.to_datetime(df["timestamp"] / 1000, unit="s")
-    df["month_year"] = df["timestamp"].dt.to_period("M").astype(str)
+@instrumented
+def average_message_length(chat: ChatAggregates) -> pd.DataFrame:
+    average_message_length = chat.sender_series(chat.length_sums.sum(axis=1) / chat.message_counts.sum(axis=1), "message_length")
+    return average_message_length.sort_values(ascending=False).reset_index()
+
+
+@instrumented
+def message_activity(chat: ChatAggregates, users: list[str] = None) -> pd.DataFrame:
+    counts = chat.sender_month_frame(chat.message_counts)
 
     if users is None:
-        return (
-            df["month_year"]
-            .value_counts()
-            .sort_index()
-            .reset_index()
-            .rename(columns={"index": "month_year", "month_year": "message_count"})
-        )
+        return counts.sum().reset_index(name="message_count")
 
     if users == "*":
-        users = df["sender_name"].dropna().unique()
+        users = chat.senders
 
-    all_months = pd.period_range(
-        start=df["timestamp"].min().to_period("M"),
-        end=df["timestamp"].max().to_period("M"),
-        freq="M"
-    ).astype(str)
+    all_months = pd.period_range(start=counts.columns.min(), end=counts.columns.max(), freq="M").astype(str)
 
-    records = []
-    for user in users:
-        user_df = df[df["sender_name"] == user]
-        monthly_counts = (
-            user_df["month_year"]
-            .value_counts()
-            .reindex(all_months, fill_value=0)
-            .sort_index()
-        )
-        for month, count in monthly_counts.items():
-            records.append({"month_year": month, "user": user, "message_count": count})
+    counts = counts.reindex(index=users, columns=all_months, fill_value=0)
+    counts.index.name = "user"
+    counts.columns.name = "month_year"
 
-    return pd.DataFrame(records)
+    return counts.stack().reset_index(name="message_count")[["month_year", "user", "message_count"]]
 
-    
-def weekly_activity(df: pd.DataFrame, user: str = None) -> pd.DataFrame:
-    df["timestamp"] = pd.to_datetime(df["timestamp"] / 1000, unit="s")
-    df["weekday"] = df["timestamp"].dt.day_name()
-    
-    if user:
-        df = df[df["sender_name"] == user]
 
-    counts = df["weekday"].value_counts().reset_index()
-    counts.columns = ["weekday", "count"]
+@instrumented
+def activity_series(chat: ChatAggregates, granularity: str = "month", top_n: int = None) -> pd.DataFrame:
+    # Messages per period (rows, oldest first and without gaps) and user (columns). Beyond
+    # the top_n most active users everyone else is summed up as REST.
+    if granularity == "month":
+        counts = chat.sender_month_frame(chat.message_counts).T
+        counts = counts.reindex(pd.period_range(counts.index.min(), counts.index.max(), freq="M").astype(str), fill_value=0)
+        counts.index.name = "month_year"
+    else:
+        days = pd.to_datetime(np.array(chat.days, dtype=np.int64), unit="D")
+        counts = pd.DataFrame(chat.day_counts.T, index=pd.DatetimeIndex(days, name="date"), columns=chat.senders)
+        counts = counts.sort_index(axis=1).resample("D" if granularity == "day" else "W-MON", label="left", closed="left").sum()
 
-    weekday_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    counts["weekday"] = pd.Categorical(counts["weekday"], categories=weekday_order, ordered=True)
+    if top_n is None or counts.shape[1] <= top_n:
+        return counts
 
-    counts = counts.sort_values("weekday").reset_index(drop=True)
+    ranked = counts.sum().sort_values(ascending=False, kind="stable").index
+    return counts[ranked[:top_n]].assign(**{REST: counts[ranked[top_n:]].sum(axis=1)})
 
-    return counts
 
+@instrumented
+def weekly_activity(chat: ChatAggregates, user: str = None) -> pd.DataFrame:
+    counts = chat.cube(user or None).sum(axis=(0, 2, 3), dtype=np.int64)
 
+    counts = pd.DataFrame({
+        "weekday": pd.Categorical(WEEKDAYS, categories=WEEKDAYS, ordered=True),
+        "count": counts,
+    })
 
+    return counts[counts["count"] > 0].reset_index(drop=True)
 
-def top_emojis(df: pd.DataFrame, top_n: int | None = 3) -> pd.DataFrame:
-    df["emojis"] = df["text_data"].apply(extract_emojis)
 
-    sender_emoji_counts = (
-        df.groupby("sender_name")["emojis"]
-        .apply(lambda lists: sum(lists, []))
-        .apply(Counter)
-    )
+@instrumented
+def activity_heatmap(chat: ChatAggregates, user: str = None) -> pd.DataFrame:
+    # Messages per weekday and hour of the day (UTC) of one user, or of everyone.
+    counts = chat.cube(user or None).sum(axis=(0, 3), dtype=np.int64)
+    return pd.DataFrame(counts, index=pd.Index(WEEKDAYS, name="weekday"), columns=pd.RangeIndex(24, name="hour"))
+
+
+@instrumented
+def reply_latency(chat: ChatAggregates, top_n: int = None) -> pd.DataFrame:
+    # Replies of every user per latency bucket and their share of all replies of the user.
+    # Beyond the top_n most active users everyone else is counted as REST.
+    counts = pd.DataFrame(chat.latency_counts.sum(axis=1), index=pd.Index(chat.senders, name="sender_name"), columns=LATENCY_LABELS)
+    counts = counts[counts.sum(axis=1) > 0].sort_index()
+    if top_n is not None and len(counts) > top_n:
+        rest = counts.index.isin(message_count(chat)["sender_name"].iloc[top_n:])
+        counts = pd.concat([counts[~rest], counts[rest].sum().to_frame(REST).T.rename_axis("sender_name")])
+
+    result = counts.reset_index().melt(id_vars="sender_name", var_name="latency", value_name="count")
+    result["latency"] = pd.Categorical(result["latency"], categories=LATENCY_LABELS, ordered=True)
+    result["share"] = result["count"] / result.groupby("sender_name")["count"].transform("sum")
+    return result
+
+
+@instrumented
+def reply_matrix(chat: ChatAggregates) -> pd.DataFrame:
+    # Replies [replier, replied to] between the users that wrote within the selection.
+    active = chat.message_counts.sum(axis=1) > 0
+    senders = [sender for sender, keep in zip(chat.senders, active) if keep]
+    replies = chat.replies[np.ix_(active, active)].sum(axis=2, dtype=np.int64)
+    return pd.DataFrame(replies, index=pd.Index(senders, name="replier"), columns=pd.Index(senders, name="replied_to")).sort_index().sort_index(axis=1)
+
 
+@instrumented
+def conversation_sessions(chat: ChatAggregates) -> pd.DataFrame:
+    # Conversations opened per month, with their average number of messages and minutes.
+    sessions = pd.DataFrame({
+        "sessions": chat.session_starts.sum(axis=0),
+        "messages": chat.message_counts.sum(axis=0),
+        "minutes": chat.session_ms.sum(axis=0) / 60_000,
+    }, index=pd.Index(chat.months, name="month_year"))
+    sessions = sessions[sessions["sessions"] > 0]
+
+    return sessions.assign(
+        messages_per_session=sessions["messages"] / sessions["sessions"],
+        minutes_per_session=sessions["minutes"] / sessions["sessions"],
+    ).reset_index()
+
+
+@instrumented
+def conversation_starters(chat: ChatAggregates) -> pd.DataFrame:
+    starts = chat.sender_series(chat.session_starts.sum(axis=1), "count")
+    return starts[starts > 0].sort_values(ascending=False, kind="stable").reset_index()
+
+
+@instrumented
+def top_emojis(chat: ChatAggregates, top_n: int | None = 3) -> pd.DataFrame:
     top_emojis = {
-        sender: [emoji for emoji, _ in counter.most_common()] if top_n is None
-        else [emoji for emoji, _ in counter.most_common(top_n)]
-        for sender, counter in sender_emoji_counts.items()
+        sender: [emoji for emoji, _ in chat.emojis.get(sender, Counter()).most_common(top_n)]
+        for sender in sorted(chat.senders)
     }
 
     max_len = max(len(emojis) for emojis in top_emojis.values())
@@ -109,144 +167,251 @@ def top_emojis(df: pd.DataFrame, top_n: int | None = 3) -> pd.DataFrame:
     return emoji_df
 
 
-def emoji_density(df: pd.DataFrame) -> pd.DataFrame:
-    df["emojis"] = df["text_data"].apply(extract_emojis)
-    df["emoji_count"] = df["emojis"].apply(len)
-    return df.groupby("sender_name")["emoji_count"].sum().reset_index(name="count")
-    
+@instrumented
+def emoji_density(chat: ChatAggregates) -> pd.DataFrame:
+    return chat.sender_series(chat.emoji_totals.sum(axis=1), "count").reset_index()
+
 
+@instrumented
+def sentiment_counts(chat: ChatAggregates) -> pd.DataFrame:
+    totals = chat.sentiments.sum(axis=1)
+    ratios = pd.DataFrame(
+        {"positive_ratio": positive_share(totals), "negative_ratio": negative_share(totals)},
+        index=pd.Index(chat.senders, name="sender_name"),
+    ).dropna().sort_index().reset_index()
 
-def sentiment_counts(df: pd.DataFrame) -> pd.DataFrame:
-    filtered = df[df["sentiment"].isin(["positive", "negative"])]
+    melted = ratios.melt(id_vars="sender_name", value_vars=["positive_ratio", "negative_ratio"], var_name="sentiment", value_name="ratio")
 
-    counts = (
-        filtered.groupby(["sender_name", "sentiment"])
-        .size()
-        .unstack(fill_value=0)
+    # Positive ratios first ("positive_ratio" sorts after "negative_ratio"), each from the highest down.
+    return melted.sort_values(by=["sentiment", "ratio"], ascending=[False, False])
+
+
+@instrumented
+def monthly_sentiment_score(
+    chat: ChatAggregates, average: bool = False, top_n: int = None, metric: str = "positive_share", trend: str = None, window: int = 3
+) -> pd.DataFrame:
+    # `metric` of the sentiments per sender and month, or averaged over the senders. A
+    # `trend` ("rolling" or "ema") scores the sums of the last `window` months instead.
+    # Beyond the top_n most active users the sentiments of everyone else are scored as REST.
+    order = np.argsort(chat.senders, kind="stable")
+    senders = np.array(chat.senders, dtype=object)[order]
+    sentiments = chat.sentiments[order]
+    if top_n is not None and not average and len(senders) > top_n:
+        rest = np.isin(senders, message_count(chat)["sender_name"].iloc[top_n:])
+        sentiments = np.concatenate([sentiments[~rest], sentiments[rest].sum(axis=0, keepdims=True)])
+        senders = [*senders[~rest], REST]
+    if trend is not None and chat.months:
+        # Trends step over calendar months, those without messages are empty ones in there
+        # and left out of the scores again.
+        calendar = pd.period_range(min(chat.months), max(chat.months), freq="M").astype(str)
+        positions = calendar.get_indexer(chat.months)
+        padded = np.zeros((sentiments.shape[0], len(calendar), sentiments.shape[2]))
+        padded[:, positions] = sentiments
+        sentiments = TRENDS[trend](padded, window)[:, positions]
+
+    scores = pd.DataFrame(
+        METRICS[metric](sentiments),
+        index=pd.Index(senders, name="sender_name"),
+        columns=pd.Index(chat.months, name="month_year"),
     )
+    if not average:
+        return scores.stack().dropna().reset_index(name="sentiment_score")
 
-    counts["total_pos_neg"] = counts.sum(axis=1)
-    counts["positive_ratio"] = counts.get("positive", 0) / counts["total_pos_neg"]
-    counts["negative_ratio"] = counts.get("negative", 0) / counts["total_pos_neg"]
+    return scores.mean().dropna().reset_index(name="sentiment_score").assign(sender_name="average")
 
-    ratios = counts[["positive_ratio", "negative_ratio"]].reset_index()
 
-    melted = ratios.melt(id_vars="sender_name", value_vars=["positive_ratio", "negative_ratio"], var_name="sentiment", value_name="ratio")
+@instrumented
+def count_link_messages(chat: ChatAggregates) -> pd.DataFrame:
+    return chat.sender_series(chat.link_counts.sum(axis=1), "link_message_count").reset_index()
 
-    melted["sentiment_order"] = melted["sentiment"].apply(lambda x: 0 if x == "positive_ratio" else 1)
-    melted = melted.sort_values(by=["sentiment_order", "ratio"], ascending=[True, False])
-    melted = melted.drop(columns="sentiment_order")
 
-    return melted
+@instrumented
+def mention_matrices(chat: ChatAggregates) -> tuple[list[str], np.ndarray, np.ndarray]:
+    # Only users that wrote in the chat, both matrices are indexed [mentioned, sender].
+    keep = [i for i, name in enumerate(chat.mention_names) if name in chat.mention_senders]
+    return (
+        [chat.mention_names[i] for i in keep],
+        chat.mentions[np.ix_(keep, keep)].sum(axis=2),
+        chat.direct_mentions[np.ix_(keep, keep)].sum(axis=2),
+    )
 
 
-def monthly_sentiment_score(df: pd.DataFrame, average: bool = False) -> pd.DataFrame:
-    df["date"] = pd.to_datetime(df["timestamp"] / 1000, unit="s", errors="coerce")
+@instrumented
+def count_mentions(chat: ChatAggregates, direction_mentions: bool = False) -> pd.DataFrame:
+    senders, mentions, direct_mentions = mention_matrices(chat)
+    return pd.DataFrame(direct_mentions if direction_mentions else mentions, index=senders, columns=senders)
 
-    filtered = df[df["sentiment"].isin(["positive", "negative"])].copy()
-    filtered["month_year"] = filtered["date"].dt.to_period("M").astype(str)
 
-    counts = (
-        filtered.groupby(["sender_name", "month_year", "sentiment"])
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
+@instrumented
+def message_type_distribution(chat: ChatAggregates, include_other_types: bool = False) -> pd.DataFrame:
+    counts = pd.DataFrame(
+        chat.type_counts,
+        index=pd.Index(chat.senders, name="sender_name"),
+        columns=pd.Index(MESSAGE_TYPES, name="message_type_label"),
     )
+    counts = counts.stack().reset_index(name="count")
 
-    counts["total"] = counts.get("positive", 0) + counts.get("negative", 0)
-    counts["sentiment_score"] = counts.apply(
-        lambda row: row["positive"] / row["total"] if row["total"] > 0 else 0.5, axis=1
-    )
-    
-    result = counts[["sender_name", "month_year", "sentiment_score"]]
-    if not average:
-        return result
+    return counts[counts["count"] > 0].sort_values(["sender_name", "message_type_label"]).reset_index(drop=True)
 
-    avg_scores = (
-        result.groupby("month_year")["sentiment_score"]
-        .mean()
-        .reset_index()
-        .assign(sender_name="average")
+
+@instrumented
+def read_chat_csv(path, names: list[str] = None, chunksize: int = None) -> pd.DataFrame:
+    # `names` is the csv header when reading the tail of an export without its first line,
+    # with a `chunksize` an iterator over frames of that many rows is returned.
+    columns_of_interest = ["sender_jid_row_id", "timestamp", "message_type", "text_data", "sort_id", *SENTIMENT_COLUMNS]
+
+    reader = pd.read_csv(
+        path,
+        names=names,
+        header=None if names else "infer",
+        usecols=lambda col: col in columns_of_interest,
+        dtype={"sender_jid_row_id": str, "timestamp": "int64", "text_data": object},
+        chunksize=chunksize,
     )
 
-    return avg_scores
+    if chunksize:
+        return map(drop_incomplete_sentiments, reader)
+    return drop_incomplete_sentiments(reader)
+
+
+def drop_incomplete_sentiments(df: pd.DataFrame) -> pd.DataFrame:
+    contains_sentiments = all(col in df.columns for col in SENTIMENT_COLUMNS)
+    if not contains_sentiments:
+        df = df.drop(columns=[col for col in SENTIMENT_COLUMNS if col in df.columns])
+
+    return df
 
-def count_link_messages(df: pd.DataFrame) -> pd.DataFrame:
-    df["has_link"] = df["text_data"].str.contains(r"https?://", case=False, na=False)
-    link_counts = df.groupby("sender_name")["has_link"].sum().reset_index()
-    return link_counts.rename(columns={"has_link": "link_message_count"})
 
+MSGSTORE_QUERY = """
+    SELECT CAST(sender_jid_row_id AS TEXT) AS sender_jid_row_id, timestamp, message_type, text_data, sort_id
+    FROM message
+    WHERE chat_row_id = ? AND sort_id > ?
+    ORDER BY sort_id
+"""
 
-def normalize_name(name: str, alias_dict: dict):
-    name = str(name).lower().strip()
-    for canonical, aliases in alias_dict.items():
-        if name == canonical or name in aliases:
-            return canonical
-    return name
+MSGSTORE_JID_QUERY = """
+    SELECT DISTINCT CAST(message.sender_jid_row_id AS TEXT), jid.user
+    FROM message
+    JOIN jid ON jid._id = message.sender_jid_row_id
+    WHERE message.chat_row_id = ?
+"""
 
 
-def count_mentions(df: pd.DataFrame, alias_dict: dict = None, direction_mentions: bool = False) -> pd.DataFrame:
-    df = df[df["sender_name"].str.lower() != "other"]
-    df["sender_normalized"] = df["sender_name"].apply(lambda n: normalize_name(n, alias_dict))
-    senders = df["sender_normalized"].dropna().unique()
+MSGSTORE_DTYPES = {"sender_jid_row_id": object, "timestamp": "int64", "message_type": "int64", "text_data": object, "sort_id": "int64"}
 
-    mention_counts = {sender: {other: 0 for other in senders} for sender in senders}
 
-    for sender in senders:
-        sender_msgs = df[df["sender_normalized"] == sender]["text_data"].dropna().astype(str)
-        for mentioned in senders:
-            if mentioned == sender:
-                continue
+def iter_msgstore(path: str, chat_row_id: int, after_sort_id: int = -1, chunksize: int = 100_000):
+    params = (chat_row_id, after_sort_id)
 
-            aliases = alias_dict.get(mentioned, [])
-            if direction_mentions:
-                aliases = [a for a in aliases if a.isdigit()]
-                all_names = aliases
-            else:
-                all_names = [mentioned] + aliases
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+        for df in pd.read_sql_query(MSGSTORE_QUERY, connection, params=params, chunksize=chunksize, dtype=MSGSTORE_DTYPES):
+            # Missing texts come back as None, read_csv gives NaN.
+            df["text_data"] = df["text_data"].fillna(np.nan)
+            yield df
 
-            if not all_names:
-                continue
 
-            pattern = re.compile(r"\b(" + "|".join(map(re.escape, all_names)) + r")\b", re.IGNORECASE)
-            count = sender_msgs.str.count(pattern).sum()
-            mention_counts[sender][mentioned] = count
+@instrumented
+def read_msgstore(path: str, chat_row_id: int, after_sort_id: int = -1, chunksize: int = 100_000) -> pd.DataFrame:
+    chunks = list(iter_msgstore(path, chat_row_id, after_sort_id, chunksize))
 
-    mention_df = pd.DataFrame(mention_counts)
-    return mention_df
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in MSGSTORE_DTYPES.items()})
 
+    return pd.concat(chunks, ignore_index=True)
 
-def message_type_distribution(df: pd.DataFrame, include_other_types: bool = False) -> pd.DataFrame:
-    df["message_type_str"] = df["message_type"].astype(str)
-    df["message_type_label"] = df["message_type_str"].map(MESSAGE_TYPE_MAP)
-    df = df[df["message_type_str"].isin(MESSAGE_TYPE_MAP.keys())]
 
-    counts = df.groupby(["sender_name", "message_type_label"]).size().reset_index(name="count")
+def msgstore_jid_names(path: str, chat_row_id: int) -> dict:
+    # Phone number (the user part of the JID) of everyone who wrote in the chat, used
+    # as name for all senders that are not listed in the jidMap.
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+        return dict(connection.execute(MSGSTORE_JID_QUERY, (chat_row_id,)).fetchall())
 
-    return counts
 
+@instrumented
+def prepare_data(config: dict, path: str = None, use_cache: bool = True, n_jobs: int = 1) -> pd.DataFrame:
+    path = path or config.get("chatPath", "./data/group-chat.csv")
+
+    cached = cache_path(path, config) if use_cache else None
+    if cached:
+        df = read_cache(cached)
+        if df is not None:
+            return df
+
+    if path.endswith(".db"):
+        df = read_msgstore(path, config["chatRowId"])
+        df = label_senders(df, config, msgstore_jid_names(path, config["chatRowId"]))
+    else:
+        df = label_senders(read_chat_csv(path), config)
+
+    # Workers only analyse the texts not in the feature table yet and send back their columns.
+    features = TextFeatures(text_features_path(path) if use_cache else None)
+    df = compact_columns(df.assign(**features.derived_columns(df["text_data"], n_jobs)))
+    features.save()
+
+    if cached:
+        write_cache(df, cached)
+
+    return df
 
-def prepare_data(config: dict) -> pd.DataFrame:
-    df = pd.read_csv("./data/group-chat.csv")
-    
-    
-    sentiment_columns = ["sentiment", "score"]
-    
-    contains_sentiments = all(col in df.columns for col in sentiment_columns)
-    
-    columns_of_interest = ["sender_jid_row_id", "timestamp", "message_type", "text_data"]
-    if contains_sentiments:
-        columns_of_interest.extend(sentiment_columns)
-    
-    df = df[columns_of_interest]
 
-    df["sender_jid_row_id"] = df["sender_jid_row_id"].astype(str)
-    df["sender_name"] = df["sender_jid_row_id"].map(config["jidMap"])
-    df["sender_name"] = df["sender_name"].apply(lambda x: "Other" if x in config["other"] else x)
+def stream_data(config: dict, path: str = None, chunksize: int = 100_000):
+    # Prepared frames of at most `chunksize` messages, for chats that do not fit in memory
+    # at once. Nothing is cached, the frames are meant to be folded into ChatAggregates.
+    path = path or config.get("chatPath", "./data/group-chat.csv")
+
+    if path.endswith(".db"):
+        jid_names = msgstore_jid_names(path, config["chatRowId"])
+        chunks = (label_senders(df, config, jid_names) for df in iter_msgstore(path, config["chatRowId"], chunksize=chunksize))
+    else:
+        chunks = (label_senders(df, config) for df in read_chat_csv(path, chunksize=chunksize))
+
+    for df in chunks:
+        yield enrich_data(df)
+
+
+@instrumented
+def label_senders(df: pd.DataFrame, config: dict, jid_names: dict = None) -> pd.DataFrame:
+    jid_map = {**(jid_names or {}), **config["jidMap"]}
+    jid_map = {jid: "Other" if name in config["other"] else name for jid, name in jid_map.items()}
+    sender_names = df["sender_jid_row_id"].map(jid_map).astype("category")
 
     if config["excludeOther"]:
-        df = df[df["sender_name"].str.lower() != "other"]
+        keep = (sender_names.str.lower() != "other").to_numpy()
+        df, sender_names = df[keep], sender_names[keep].cat.remove_unused_categories()
 
+    # Set on the new frame of reset_index, df may be a slice of the caller's frame.
+    df = df.reset_index(drop=True)
+    df["sender_name"] = sender_names.array
     return df
 
 
+def enrich_data(df: pd.DataFrame) -> pd.DataFrame:
+    # Columns shared by all aggregations, computed once per distinct text of the frame.
+    # Dates are taken from the timestamps by ChatAggregates and compact_columns.
+    return compact_columns(df.assign(**TextFeatures().derived_columns(df["text_data"])))
+
+
+def month_categories(timestamps: pd.Series) -> pd.Series:
+    # "YYYY-MM" of epoch milliseconds, as codes into the months from the first to the last one.
+    # Ordered, so that months compare and sort chronologically.
+    months = timestamps.to_numpy(dtype=np.int64).astype("datetime64[ms]").astype("datetime64[M]").astype(np.int64)
+    first, last = (months.min(), months.max()) if len(months) else (0, -1)
+    categories = np.arange(first, last + 1).astype("datetime64[M]").astype(str)
+    return pd.Series(pd.Categorical.from_codes(months - first, categories, ordered=True), index=timestamps.index)
+
+
+def compact_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Values repeated across messages become categorical codes into a dictionary of the
+    # distinct ones, texts a single Arrow buffer.
+    columns = {
+        "sender_jid_row_id": df["sender_jid_row_id"].astype("category"),
+        "message_type": df["message_type"].astype("category"),
+        "text_data": df["text_data"].astype(TEXT_DTYPE),
+        "month_year": month_categories(df["timestamp"]),
+    }
+    if "sentiment" in df.columns:
+        columns["sentiment"] = df["sentiment"].astype("category")
+
+    return df.assign(**columns)
+
+
@@ -0,0 +1,374 @@
+import argparse
+import base64
+import gzip
+import html
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
+from plotly.offline import get_plotlyjs
+from plotly.offline.offline import get_plotlyjs_version
+from aggregates import ChatAggregates
+from data import message_count, top_emojis
+from figure_cache import serialize_figure
+from groups import GROUPS_DIR, find_groups
+from instrumentation import instrumented
+from live import LiveChat
+from parallel import default_workers
+from plots import (
+    plot_message_count_pie,
+    plot_message_count_bar,
+    plot_average_message_length,
+    plot_monthly_activity,
+    plot_monthly_activity_stacked,
+    plot_weekly_activity_group,
+    plot_user_weekly_activity,
+    plot_sentiment_ratios,
+    plot_emoji_density,
+    plot_mentions_heatmap,
+    plot_direct_mentions_heatmap,
+    plot_message_type_distribution,
+    plot_link_distribution,
+    plot_monthly_sentiment_line,
+    plot_activity_heatmap,
+    plot_reply_latency,
+    plot_reply_matrix,
+    plot_conversation_sessions,
+    plot_conversation_starters
+)
+from utils import load_json
+
+
+STYLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "style.css")
+
+GRANULARITIES = [("month", "Months"), ("week", "Weeks"), ("day", "Days")]
+SENTIMENT_MODES = {"all": {}, "average": {"average": True}, "trend": {"trend": "ema"}}
+MEDIA = [
+    ("image", "Images", "Meme Lord", "🖼️"),
+    ("sticker", "Stickers", "Sticker Collector", "🎫"),
+    ("map", "Maps", "Navigator", "🗺️"),
+    ("link", "Links", "Intel-Man", "🔗"),
+    ("deleted", "Deleted", "Retractor", "❌"),
+]
+
+# The figures are gzipped JSON in base64 within the page, the browser only inflates
+# (DecompressionStream) and draws those of the graphs scrolled into view. A select swaps
+# the figures of the graphs it names for the ones of its value, "<graph>/<value>".
+PAGE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$title</title>
+$plotlyjs
+<style>
+$style
+.page { margin: 25px; }
+.section { background-color: #f0f0f0; border-radius: 5px; padding: 20px; margin-bottom: 20px; }
+.row { display: flex; flex-wrap: wrap; }
+.graph { flex: 1; min-width: 500px; height: 450px; }
+.controls { display: flex; justify-content: center; gap: 20px; }
+.medals { display: flex; gap: 20px; justify-content: center; }
+.column { display: flex; flex-direction: column; flex: 1; align-items: center; }
+.column .graph { width: 100%; }
+table.emojis { margin: 100px auto; width: 80%; border-collapse: collapse; font-size: 22px; text-align: center; }
+table.emojis th { font-weight: bold; background-color: #f9f9f9; }
+table.emojis td, table.emojis th { border: 1px solid #d0d0d0; padding: 4px; }
+</style>
+</head>
+<body>
+<div class="page">
+$body
+</div>
+<script id="figures" type="application/json">$figures</script>
+<script>
+const figures = JSON.parse(document.getElementById("figures").textContent);
+const inflated = {};
+
+function inflate(key) {
+  if (!(key in inflated)) {
+    const bytes = Uint8Array.from(atob(figures[key]), c => c.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+    inflated[key] = new Response(stream).json();
+  }
+  return inflated[key];
+}
+
+async function draw(graph) {
+  const figure = await inflate(graph.dataset.figure);
+  Plotly.react(graph, figure.data, figure.layout, {responsive: true});
+}
+
+const visible = new IntersectionObserver(entries => {
+  for (const entry of entries) {
+    if (entry.isIntersecting) {
+      visible.unobserve(entry.target);
+      entry.target.dataset.drawn = "true";
+      draw(entry.target);
+    }
+  }
+}, {rootMargin: "200px"});
+document.querySelectorAll(".graph").forEach(graph => visible.observe(graph));
+
+document.querySelectorAll("select[data-graphs]").forEach(select => select.addEventListener("change", () => {
+  for (const id of select.dataset.graphs.split(" ")) {
+    const graph = document.getElementById(id);
+    graph.dataset.figure = id + "/" + select.value;
+    if (graph.dataset.drawn) draw(graph);
+  }
+}));
+</script>
+</body>
+</html>
+""")
+
+INDEX = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>WhatsApp Groups Analyzed</title>
+<style>
+$style
+.page { margin: 25px; }
+.section { background-color: #f0f0f0; border-radius: 5px; padding: 20px; margin-bottom: 20px; }
+</style>
+</head>
+<body>
+<div class="page">
+<h1 class="section">🔎 WhatsApp Groups Analyzed</h1>
+<ul class="section">
+$groups
+</ul>
+</div>
+</body>
+</html>
+""")
+
+
+def compress(figure) -> str:
+    # mtime=0 so that the same figure always gives the same bytes.
+    return base64.b64encode(gzip.compress(serialize_figure(figure), mtime=0)).decode("ascii")
+
+
+def graph(figures: dict, graph_id: str, figure) -> str:
+    figures[graph_id] = compress(figure)
+    return f'<div class="graph" id="{graph_id}" data-figure="{graph_id}"></div>'
+
+
+def views(figures: dict, graph_ids: list[str], plots: dict):
+    # Figures of every option of a select for each of the graphs it controls.
+    for value, plot in plots.items():
+        for graph_id, figure in zip(graph_ids, plot()):
+            figures[f"{graph_id}/{value}"] = compress(figure)
+
+
+def view(graph_id: str, selected: str) -> str:
+    return f'<div class="graph" id="{graph_id}" data-figure="{html.escape(f"{graph_id}/{selected}")}"></div>'
+
+
+def select(graph_ids: list[str], options: list[tuple[str, str]]) -> str:
+    choices = "".join(f'<option value="{html.escape(value)}">{html.escape(label)}</option>' for value, label in options)
+    return f'<div class="controls"><select data-graphs="{" ".join(graph_ids)}">{choices}</select></div>'
+
+
+def section(*children: str) -> str:
+    return f'<div class="section">{"".join(child for child in children if child)}</div>'
+
+
+def row(*children: str) -> str:
+    return f'<div class="row">{"".join(children)}</div>'
+
+
+def heading(text: str, level: int = 2) -> str:
+    return f'<h{level} class="section">{html.escape(text)}</h{level}>'
+
+
+def render_yappers(chat: ChatAggregates, figures: dict) -> str:
+    medals = "".join(f"<h3>{medal} {html.escape(user)}</h3>" for medal, user in zip(["🥇", "🥈", "🥉"], message_count(chat)["sender_name"]))
+    return section(
+        row(
+            graph(figures, "message-count-pie", plot_message_count_pie(chat)),
+            graph(figures, "message-count-bar", plot_message_count_bar(chat)),
+            graph(figures, "average-message-length", plot_average_message_length(chat)),
+        ),
+        f'<div class="medals">{medals}</div>',
+    )
+
+
+def render_co_dependency(chat: ChatAggregates, figures: dict) -> str:
+    activity = ["monthly-activity", "monthly-activity-stacked"]
+    views(figures, activity, {
+        granularity: lambda granularity=granularity: [plot_monthly_activity(chat, granularity), plot_monthly_activity_stacked(chat, granularity)]
+        for granularity, _ in GRANULARITIES
+    })
+
+    # The user select switches both the weekly activity and the heatmap of the user.
+    users = sorted(chat.senders)
+    per_user = ["weekly-activity-plot", "activity-heatmap"]
+    views(figures, per_user, {user: (lambda user=user: [plot_user_weekly_activity(chat, user), plot_activity_heatmap(chat, user)]) for user in users})
+
+    return "".join([
+        section(
+            select(activity, GRANULARITIES),
+            row(*(view(graph_id, "month") for graph_id in activity)),
+        ),
+        section(row(
+            graph(figures, "weekly-activity-group", plot_weekly_activity_group(chat)),
+            f'<div class="column">{view("weekly-activity-plot", users[0])}{select(per_user, [(user, user) for user in users])}</div>' if users else "",
+        )),
+        section(row(
+            view("activity-heatmap", users[0]) if users else "",
+            graph(figures, "reply-latency", plot_reply_latency(chat)),
+        )),
+        section(row(
+            graph(figures, "mentions-heatmap", plot_mentions_heatmap(chat)),
+            graph(figures, "direct-mentions-heatmap", plot_direct_mentions_heatmap(chat)),
+        )),
+        section(row(
+            graph(figures, "reply-matrix", plot_reply_matrix(chat)),
+            graph(figures, "conversation-sessions", plot_conversation_sessions(chat)),
+            graph(figures, "conversation-starters", plot_conversation_starters(chat)),
+        )),
+    ])
+
+
+def render_emotions(chat: ChatAggregates, figures: dict) -> str:
+    emoji_df = top_emojis(chat, top_n=3)
+    header = "".join(f"<th>{html.escape(str(column))}</th>" for column in emoji_df.columns)
+    rows = "".join("<tr>" + "".join(f"<td>{html.escape(str(value))}</td>" for value in record) + "</tr>" for record in emoji_df.itertuples(index=False))
+
+    sentiments = ""
+    if chat.contains_sentiments:
+        modes = {mode: (lambda kwargs=kwargs: [plot_monthly_sentiment_line(chat, **kwargs)]) for mode, kwargs in SENTIMENT_MODES.items()}
+        views(figures, ["monthly-sentiment-plot"], modes)
+        sentiments = "".join([
+            graph(figures, "sentiment-ratios", plot_sentiment_ratios(chat)),
+            view("monthly-sentiment-plot", "all"),
+            select(["monthly-sentiment-plot"], [(mode, mode) for mode in SENTIMENT_MODES]),
+        ])
+
+    return section(
+        row(
+            f'<div class="column"><table class="emojis"><thead><tr>{header}</tr></thead><tbody>{rows}</tbody></table></div>',
+            graph(figures, "emoji-density", plot_emoji_density(chat)),
+        ),
+        sentiments,
+    )
+
+
+def render_media(chat: ChatAggregates, figures: dict) -> str:
+    rows = []
+    for name, title, winner, emoji in MEDIA:
+        figure, top_sender = plot_link_distribution(chat) if name == "link" else plot_message_type_distribution(chat, name, title)
+        title = f"{winner}: {top_sender}" if top_sender else winner
+        rows.append(f'<div class="column"><h2>{emoji} {html.escape(title)}</h2>{graph(figures, f"{name}-distribution", figure)}</div>')
+    rows.append('<div class="column"></div>')
+    return section(*(row(*rows[i:i + 2]) for i in range(0, len(rows), 2)))
+
+
+@instrumented
+def render_snapshot(chat: ChatAggregates, group_name: str, plotlyjs: str = "cdn") -> str:
+    # Every figure the dashboard can show without filters, as one standalone page.
+    figures = {}
+    body = "".join([
+        heading(f"🔎 {group_name} - Analyzed", 1),
+        heading("👄 Biggest Yappers"),
+        render_yappers(chat, figures),
+        heading("🖇️ Most Co-Dependent"),
+        render_co_dependency(chat, figures),
+        heading("❤️ Pure Emotions"),
+        render_emotions(chat, figures),
+        heading("📱 Multi Media"),
+        render_media(chat, figures),
+    ])
+
+    if plotlyjs == "inline":
+        script = f"<script>{get_plotlyjs()}</script>"
+    else:
+        script = f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>'
+
+    with open(STYLE_PATH) as f:
+        style = f.read()
+
+    return PAGE.substitute(
+        title=html.escape(f"{group_name} - Analyzed"),
+        plotlyjs=script,
+        style=style,
+        body=body,
+        # "<" escaped so that no text of the chat can close the script tag.
+        figures=json.dumps(figures).replace("<", "\\u003c"),
+    )
+
+
+def export_group(config: dict, path: str, output: str, plotlyjs: str = "cdn") -> str:
+    start = time.perf_counter()
+    chat = LiveChat(config, path).chat
+    page = render_snapshot(chat, config["groupName"], plotlyjs)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(page)
+    os.replace(tmp_path, output)
+
+    print(f"{config['groupName']}: {output} ({len(page) >> 10} KiB) in {time.perf_counter() - start:.1f}s", flush=True)
+    return output
+
+
+def export_group_or_report(name: str, group_dir: str, output: str, plotlyjs: str = "cdn") -> str | None:
+    # A group that fails to export is reported and skipped, the others are exported anyway.
+    try:
+        config = load_json(os.path.join(group_dir, "config.json"))
+        path = os.path.join(group_dir, config.get("chatPath", "group-chat.csv"))
+        return export_group(config, path, output, plotlyjs)
+    except Exception:
+        print(f"{name}: export failed", file=sys.stderr, flush=True)
+        traceback.print_exc()
+        return None
+
+
+def export_all(output: str, groups_dir: str = GROUPS_DIR, config_path: str = "./data/config.json", plotlyjs: str = "cdn", n_jobs: int = None) -> dict[str, str | None]:
+    # A page per group in groups_dir and an index linking them, like the dashboard serves
+    # them under /<group>. The groups are exported on n_jobs processes. Returns the page of
+    # every group, None for those that failed.
+    group_dirs = find_groups(groups_dir)
+    if not group_dirs:
+        config = load_json(config_path)
+        return {"": export_group(config, None, os.path.join(output, "index.html"), plotlyjs)}
+
+    jobs = [(name, group_dir, os.path.join(output, name, "index.html"), plotlyjs) for name, group_dir in group_dirs.items()]
+
+    n_jobs = min(n_jobs or default_workers(), len(jobs))
+    if n_jobs <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        pages = [export_group_or_report(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(n_jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+            pages = list(pool.map(export_group_or_report, *zip(*jobs)))
+    pages = dict(zip(group_dirs, pages))
+
+    with open(STYLE_PATH) as f:
+        style = f.read()
+    links = "".join(f'<li><h2><a href="{html.escape(name)}/index.html">{html.escape(name)}</a></h2></li>' for name, page in pages.items() if page)
+    with open(os.path.join(output, "index.html"), "w", encoding="utf-8") as f:
+        f.write(INDEX.substitute(style=style, groups=links))
+
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the dashboard as static html pages.")
+    parser.add_argument("--output", type=str, default="./snapshot", help="Directory of the pages")
+    parser.add_argument("--groups-dir", type=str, default=GROUPS_DIR, help="Directory with a folder per group")
+    parser.add_argument("--config", type=str, default="./data/config.json", help="Config of the single chat, used when there are no groups")
+    parser.add_argument("--plotlyjs", choices=["cdn", "inline"], default="cdn", help="Load plotly.js from its CDN or embed it in every page")
+    parser.add_argument("--workers", type=int, default=None, help="Number of groups exported at once, default: all cores")
+    args = parser.parse_args()
+
+    pages = export_all(args.output, args.groups_dir, args.config, args.plotlyjs, args.workers)
+    failed = [name for name, page in pages.items() if page is None]
+    if failed:
+        sys.exit(f"Failed to export {len(failed)} of {len(pages)} groups: {', '.join(failed)}")
@@ -0,0 +1,92 @@
+import json
+import threading
+from collections import OrderedDict
+from plotly.io.json import to_json_plotly
+from instrumentation import instrumented
+
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+
+@instrumented
+def serialize_figure(figure) -> bytes:
+    return to_json_plotly(figure).encode()
+
+
+class FigureCache:
+    # Bounded LRU of serialized figures keyed on (chat, plot function, arguments, data version).
+    # Building a plotly express figure and serializing it dominates callback latency, a hit
+    # only parses the stored json back into a plain dict that dcc.Graph accepts as figure.
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.versions: dict[int, int] = {}
+        self.entries: OrderedDict[tuple, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __call__(self, plot, chat, *args, **kwargs):
+        key = (chat.token, getattr(chat, "selection", None), plot.__module__, plot.__qualname__, args, tuple(sorted(kwargs.items())))
+
+        with self.lock:
+            if self.versions.get(chat.token) != chat.version:
+                # Figures of an older version of the data are never requested again.
+                self.forget(chat.token)
+                self.versions[chat.token] = chat.version
+
+            serialized = self.entries.get(key)
+            if serialized is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(serialized)
+            self.misses += 1
+
+        serialized = serialize_figure(plot(chat, *args, **kwargs))
+
+        with self.lock:
+            self.store(key, chat.version, serialized)
+
+        return json.loads(serialized)
+
+    def store(self, key: tuple, version: int, serialized: bytes):
+        # Called with the lock held.
+        if self.versions.get(key[0]) == version and key not in self.entries:
+            self.entries[key] = serialized
+            self.size += len(serialized)
+            self.evict()
+
+    def state(self) -> tuple:
+        with self.lock:
+            return set(self.entries), self.hits, self.misses
+
+    def delta(self, state: tuple) -> dict:
+        # Figures cached and lookups counted since `state`, for merging into the cache of
+        # another process.
+        known, hits, misses = state
+        with self.lock:
+            return {
+                "entries": [(key, self.versions.get(key[0]), serialized) for key, serialized in self.entries.items() if key not in known],
+                "hits": self.hits - hits,
+                "misses": self.misses - misses,
+            }
+
+    def merge(self, delta: dict):
+        # Entries of a data version this process has moved past are dropped.
+        with self.lock:
+            self.hits += delta["hits"]
+            self.misses += delta["misses"]
+            for key, version, serialized in delta["entries"]:
+                self.store(key, version, serialized)
+
+    def evict(self):
+        # Always keep the newest entry, even when it alone exceeds the budget.
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, serialized = self.entries.popitem(last=False)
+            self.size -= len(serialized)
+
+    def forget(self, token: int):
+        for key in [key for key in self.entries if key[0] == token]:
+            self.size -= len(self.entries.pop(key))
+        self.versions.pop(token, None)
@@ -0,0 +1,71 @@
+import os
+import threading
+from collections import OrderedDict
+from live import LiveChat
+from utils import load_json
+
+
+GROUPS_DIR = "./data/groups"
+DEFAULT_POOL_BYTES = 1 << 30
+
+
+def find_groups(groups_dir: str = GROUPS_DIR) -> dict[str, str]:
+    # Every directory in groups_dir with a config.json is a group, named after the directory.
+    if not os.path.isdir(groups_dir):
+        return {}
+    return {
+        name: os.path.join(groups_dir, name)
+        for name in sorted(os.listdir(groups_dir))
+        if os.path.isfile(os.path.join(groups_dir, name, "config.json"))
+    }
+
+
+def load_group(group_dir: str) -> LiveChat:
+    # A group's chatPath is relative to its directory, group-chat.csv when missing.
+    config = load_json(os.path.join(group_dir, "config.json"))
+    path = os.path.join(group_dir, config.get("chatPath", "group-chat.csv"))
+    return LiveChat(config, path)
+
+
+class GroupPool:
+    # Loaded chats of many groups in one process. A group is loaded on its first request,
+    # the least recently used ones are dropped once their aggregates exceed max_bytes.
+
+    def __init__(self, loaders: dict, max_bytes: int = DEFAULT_POOL_BYTES, on_evict=None):
+        self.loaders = loaders
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.chats: OrderedDict[str, LiveChat] = OrderedDict()
+        self.lock = threading.Lock()
+        self.loading: dict[str, threading.Lock] = {name: threading.Lock() for name in loaders}
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.loaders)
+
+    def get(self, name: str) -> LiveChat:
+        with self.lock:
+            if name in self.chats:
+                self.chats.move_to_end(name)
+                return self.chats[name]
+
+        # Concurrent first requests of a group wait for one load instead of each loading it.
+        with self.loading[name]:
+            with self.lock:
+                if name in self.chats:
+                    return self.chats[name]
+
+            live_chat = self.loaders[name]()
+
+            with self.lock:
+                self.chats[name] = live_chat
+                self.evict()
+
+        return live_chat
+
+    def evict(self):
+        # Refreshes grow the chats, so their size is taken anew on every eviction.
+        while len(self.chats) > 1 and sum(live_chat.chat.nbytes for live_chat in self.chats.values()) > self.max_bytes:
+            _, live_chat = self.chats.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(live_chat)
@@ -0,0 +1,185 @@
+import cProfile
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+
+# Opt-in, read once on import: METRICS=1 records wall and CPU time and rows of every
+# instrumented function, METRICS=memory also its peak traced memory (slows allocations
+# down). PROFILE_DIR=<dir> writes a cProfile dump of every outermost instrumented call.
+METRICS = os.environ.get("METRICS", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+ENABLED = METRICS not in ("", "0") or bool(PROFILE_DIR)
+TRACE_MEMORY = METRICS == "memory"
+
+if TRACE_MEMORY:
+    tracemalloc.start()
+
+
+class Metrics:
+    # Totals per instrumented function, shared by all threads of the server.
+
+    def __init__(self):
+        self.stats: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def stat(self, name: str) -> dict:
+        return self.stats.setdefault(name, {
+            "calls": 0, "wall_seconds": 0.0, "max_wall_seconds": 0.0, "cpu_seconds": 0.0, "rows": 0, "peak_bytes": 0,
+        })
+
+    def record(self, name: str, wall: float, cpu: float, rows: int | None, peak_bytes: int | None):
+        with self.lock:
+            stat = self.stat(name)
+            stat["calls"] += 1
+            stat["wall_seconds"] += wall
+            stat["max_wall_seconds"] = max(stat["max_wall_seconds"], wall)
+            stat["cpu_seconds"] += cpu
+            stat["rows"] += rows or 0
+            stat["peak_bytes"] = max(stat["peak_bytes"], peak_bytes or 0)
+
+    def merge(self, stats: dict[str, dict]):
+        # Totals recorded by another process, like a background job forked from the server.
+        with self.lock:
+            for name, other in stats.items():
+                stat = self.stat(name)
+                for key, value in other.items():
+                    stat[key] = max(stat[key], value) if key.startswith(("max", "peak")) else stat[key] + value
+
+    def snapshot(self) -> dict[str, dict]:
+        with self.lock:
+            return {name: dict(stat) for name, stat in self.stats.items()}
+
+    def table(self) -> str:
+        # Slowest first, as printed after startup.
+        rows = sorted(self.snapshot().items(), key=lambda item: -item[1]["wall_seconds"])
+        lines = [f"{'function':<55} {'calls':>6} {'wall ms':>10} {'cpu ms':>10} {'rows':>12} {'peak MiB':>9}"]
+        for name, stat in rows:
+            peak = f"{stat['peak_bytes'] / 2**20:.1f}" if TRACE_MEMORY else "-"
+            lines.append(
+                f"{name:<55} {stat['calls']:>6} {stat['wall_seconds'] * 1000:>10.1f} {stat['cpu_seconds'] * 1000:>10.1f} {stat['rows']:>12,} {peak:>9}"
+            )
+        return "\n".join(lines)
+
+    def prometheus(self, gauges: dict[str, float] = None) -> str:
+        # Text exposition format, one sample per function and statistic.
+        lines = []
+        stats = self.snapshot()
+        for key in ["calls", "wall_seconds", "max_wall_seconds", "cpu_seconds", "rows", "peak_bytes"]:
+            metric = f"dashboard_{key}" if key.startswith(("max", "peak")) else f"dashboard_{key}_total"
+            lines.append(f"# TYPE {metric} {'gauge' if key.startswith(('max', 'peak')) else 'counter'}")
+            lines += [f'{metric}{{function="{name}"}} {stat[key]}' for name, stat in stats.items()]
+        for name, value in (gauges or {}).items():
+            lines += [f"# TYPE dashboard_{name} gauge", f"dashboard_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+
+metrics = Metrics()
+
+# Open instrumented calls of the current thread, innermost last.
+local = threading.local()
+profile_counter = itertools.count()
+
+
+def count_rows(args: tuple, result) -> int | None:
+    # Rows of the first frame passed in, else messages of the first chat passed in, else
+    # rows of the frame returned.
+    for value in args:
+        if isinstance(value, pd.DataFrame):
+            return len(value)
+    for value in args:
+        if hasattr(value, "message_counts"):
+            return int(value.message_counts.sum())
+    return len(result) if isinstance(result, pd.DataFrame) else None
+
+
+@contextmanager
+def profiled(name: str):
+    # Only the outermost call of a thread is profiled, profilers do not nest.
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another thread is profiling and the interpreter allows a single profiler.
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(PROFILE_DIR, f"{name}-{next(profile_counter)}.prof"))
+
+
+@contextmanager
+def measure(name: str, args: tuple = ()):
+    # Records the block under `name`. Yields a list, a result appended to it counts its rows.
+    stack = local.__dict__.setdefault("stack", [])
+    outermost = not stack
+
+    if TRACE_MEMORY:
+        # tracemalloc keeps a single peak, fold it into the open calls before resetting it.
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in stack:
+            frame["peak"] = max(frame["peak"], peak)
+        tracemalloc.reset_peak()
+        stack.append({"start": current, "peak": current})
+    else:
+        stack.append({})
+
+    results = []
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        if outermost and PROFILE_DIR:
+            with profiled(name):
+                yield results
+        else:
+            yield results
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+        frame = stack.pop()
+        peak_bytes = None
+        if TRACE_MEMORY:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            for parent in stack:
+                parent["peak"] = max(parent["peak"], peak)
+            peak_bytes = peak - frame["start"]
+
+        metrics.record(name, wall, cpu, count_rows(args, results[0] if results else None), peak_bytes)
+
+
+def function_name(fn) -> str:
+    module = fn.__module__
+    if module == "__main__":
+        module = os.path.splitext(os.path.basename(sys.modules["__main__"].__file__))[0]
+    return f"{module}.{fn.__qualname__}"
+
+
+def instrumented(fn=None, *, name: str = None):
+    # Decorator recording every call of fn, returns fn itself when instrumentation is off.
+    if fn is None:
+        return functools.partial(instrumented, name=name)
+    if not ENABLED:
+        return fn
+
+    name = name or function_name(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with measure(name, args) as results:
+            result = fn(*args, **kwargs)
+            results.append(result)
+            return result
+
+    return wrapper
@@ -0,0 +1,96 @@
+import io
+import os
+import threading
+import pandas as pd
+from aggregates import ChatAggregates
+from data import enrich_data, label_senders, msgstore_jid_names, prepare_data, read_chat_csv, read_msgstore, stream_data
+
+
+class LiveChat:
+    # Keeps the aggregates of a chat up to date with its export. Only messages past the
+    # high-water mark are read on refresh: the csv is read from the byte offset where the
+    # last read stopped, the msgstore.db is queried for a larger sort_id.
+    # Callbacks on other threads keep reading `chat` meanwhile, so new messages are merged
+    # into a copy that then replaces it in one assignment.
+
+    def __init__(self, config: dict, path: str = None):
+        self.config = config
+        self.path = path or config.get("chatPath", "./data/group-chat.csv")
+        # Every open page polls for new messages, one of them reads them at a time.
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self, version: int = None):
+        # Taken before reading, rows appended meanwhile are read again and dropped by sort_id.
+        self.offset = os.path.getsize(self.path)
+
+        # Chats larger than memory are folded into the aggregates one chunk at a time.
+        chunk_size = self.config.get("streamChunkSize")
+        n_jobs = self.config.get("workers")
+        chunks = stream_data(self.config, self.path, chunk_size) if chunk_size else [prepare_data(self.config, self.path, n_jobs=n_jobs)]
+
+        chat = ChatAggregates(self.config["senderAliases"])
+        self.high_water = -1
+        for df in chunks:
+            chat.add(df, n_jobs)
+            self.high_water = self._high_water(df, self.high_water)
+        if version is not None:
+            chat.version = version
+        self.header = None if self.path.endswith(".db") else pd.read_csv(self.path, nrows=0).columns.tolist()
+        self.chat = chat
+
+    @property
+    def version(self) -> int:
+        return self.chat.version
+
+    def refresh(self) -> bool:
+        with self.lock:
+            new_messages = self.read_new_messages()
+            if new_messages is None:
+                # The export was replaced by a shorter one, nothing to append to.
+                self.load(self.chat.version + 1)
+                return True
+
+            if new_messages.empty:
+                return False
+
+            chat = self.chat.copy()
+            chat.add(enrich_data(new_messages))
+            self.chat = chat
+            return True
+
+    def read_new_messages(self) -> pd.DataFrame | None:
+        if self.path.endswith(".db"):
+            chat_row_id = self.config["chatRowId"]
+            df = read_msgstore(self.path, chat_row_id, after_sort_id=self.high_water)
+            df = label_senders(df, self.config, msgstore_jid_names(self.path, chat_row_id))
+            self.high_water = self._high_water(df, self.high_water)
+            return df
+
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            return None
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            tail = f.read(size - self.offset)
+
+        # Leave a partially written last line for the next refresh.
+        tail = tail[:tail.rfind(b"\n") + 1]
+        self.offset += len(tail)
+        if not tail.strip():
+            return pd.DataFrame()
+
+        df = read_chat_csv(io.BytesIO(tail), names=self.header)
+        df = df[df[self._high_water_column(df)] > self.high_water]
+        self.high_water = self._high_water(df, self.high_water)
+        return label_senders(df, self.config)
+
+    @staticmethod
+    def _high_water_column(df: pd.DataFrame) -> str:
+        return "sort_id" if "sort_id" in df.columns else "timestamp"
+
+    def _high_water(self, df: pd.DataFrame, default: int) -> int:
+        if df.empty:
+            return default
+        return max(default, int(df[self._high_water_column(df)].max()))
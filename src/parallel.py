@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+
+# Smaller frames are not worth starting worker processes for.
+MIN_PARTITION_ROWS = 20_000
+
+# The frame being partitioned. Forked workers inherit it with the rest of the parent's
+# memory, so only the bounds of a partition are sent to them instead of its rows.
+shared_frame = None
+
+
+def default_workers() -> int:
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+
+def run_partition(fn, start: int, stop: int):
+    return fn(shared_frame.iloc[start:stop])
+
+
+def map_partitions(fn, df: pd.DataFrame, n_jobs: int = None) -> list:
+    # Results of fn on consecutive row ranges of df, in order. fn must be picklable and
+    # runs in-process when there is a single partition or no fork start method.
+    global shared_frame
+
+    n_jobs = min(n_jobs or default_workers(), len(df) // MIN_PARTITION_ROWS)
+    if n_jobs <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [fn(df)]
+
+    bounds = np.linspace(0, len(df), n_jobs + 1).astype(int)
+
+    shared_frame = df
+    try:
+        with ProcessPoolExecutor(n_jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+            return list(pool.map(run_partition, repeat(fn), bounds[:-1], bounds[1:]))
+    finally:
+        shared_frame = None
@@ -1,30 +1,74 @@
+import numpy as np
 import pandas as pd
-import plotly.express as px
-from utils import transparent_fig
+from aggregates import ChatAggregates
+from instrumentation import instrumented
+from utils import lazy_import, transparent_fig
 from data import (
+    REST,
+    activity_heatmap,
+    activity_series,
     average_message_length,
+    conversation_sessions,
+    conversation_starters,
     count_link_messages,
-    count_mentions,
     emoji_density,
-    message_activity,
-    message_activity_stack,
+    mention_matrices,
     message_count,
     message_type_distribution,
     monthly_sentiment_score,
+    reply_latency,
+    reply_matrix,
     sentiment_counts,
     weekly_activity,
 )
 
 
-def get_color_map(df: pd.DataFrame):
-    sender_names = sorted(df["sender_name"].dropna().unique())
+# Only imported once the first figure is drawn, e.g. by the warm-up of the dashboard.
+px = lazy_import("plotly.express")
+
+# Points per trace of the time series, about one per pixel of a wide graph.
+MAX_POINTS = 1000
+# Users with a trace of their own in the time series, the others share one.
+TOP_USERS = 10
+
+GRANULARITY_TITLES = {"day": "Daily", "week": "Weekly", "month": "Monthly"}
+# Months the sentiment trend looks back on.
+TREND_SPAN = 3
+
+
+def get_color_map(chat: ChatAggregates):
+    sender_names = sorted(chat.senders)
     colors = px.colors.qualitative.Plotly
-    return {name: colors[i % len(colors)] for i, name in enumerate(sender_names)}
+    return {name: colors[i % len(colors)] for i, name in enumerate(sender_names)} | {REST: "#9e9e9e"}
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int = MAX_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    # The lowest and the highest point of max_points / 2 equally wide buckets, in order, so
+    # that peaks and gaps of long series survive.
+    if len(y) <= max_points:
+        return x, y
+
+    buckets = np.arange(len(y)) * (max_points // 2) // len(y)
+    order = np.lexsort((y, buckets))
+    starts = np.searchsorted(buckets[order], np.arange(max_points // 2))
+    ends = np.append(starts[1:], len(y)) - 1
+    keep = np.unique(np.concatenate([order[starts], order[ends]]))
+    return x[keep], y[keep]
+
 
+def long_series(wide: pd.DataFrame, value_name: str, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    # Periods x users frame as one row per (downsampled) point of every user.
+    frames = []
+    for user in wide.columns:
+        x, y = downsample(wide.index.to_numpy(), wide[user].to_numpy(), max_points)
+        frames.append(pd.DataFrame({wide.index.name: x, "user": user, value_name: y}))
+    return pd.concat(frames, ignore_index=True)
 
-def plot_message_count_pie(df: pd.DataFrame):
-    color_map = get_color_map(df)
-    user_counts = message_count(df)
+
+@instrumented
+def plot_message_count_pie(chat: ChatAggregates):
+    color_map = get_color_map(chat)
+    user_counts = message_count(chat)
     return transparent_fig(
         px.pie(
             user_counts,
@@ -37,10 +81,11 @@ def plot_message_count_pie(df: pd.DataFrame):
     )
 
 
-def plot_message_count_bar(df: pd.DataFrame):
+@instrumented
+def plot_message_count_bar(chat: ChatAggregates):
     return transparent_fig(
         px.bar(
-            message_count(df),
+            message_count(chat),
             x="sender_name",
             y="count",
             title="Messages per Person (Bar)",
@@ -48,10 +93,11 @@ def plot_message_count_bar(df: pd.DataFrame):
     )
 
 
-def plot_average_message_length(df: pd.DataFrame):
+@instrumented
+def plot_average_message_length(chat: ChatAggregates):
     return transparent_fig(
         px.bar(
-            average_message_length(df),
+            average_message_length(chat),
             x="sender_name",
             y="message_length",
             title="Average Message Length",
@@ -59,36 +105,49 @@ def plot_average_message_length(df: pd.DataFrame):
     )
 
 
-def plot_monthly_activity(df: pd.DataFrame):
-    color_map = get_color_map(df)
+@instrumented
+def plot_monthly_activity(chat: ChatAggregates, granularity: str = "month", top_n: int = TOP_USERS):
+    activity = activity_series(chat, granularity, top_n)
     return transparent_fig(
         px.line(
-            message_activity(df, users="*"),
-            x="month_year",
+            long_series(activity, "message_count"),
+            x=activity.index.name,
             y="message_count",
             color="user",
-            title="Monthly Activity per User",
-            color_discrete_map=color_map,
+            title=f"{GRANULARITY_TITLES[granularity]} Activity per User",
+            color_discrete_map=get_color_map(chat),
+            render_mode="webgl",
         )
     )
 
 
-def plot_monthly_activity_stacked(df: pd.DataFrame):
+@instrumented
+def plot_monthly_activity_stacked(chat: ChatAggregates, granularity: str = "month", top_n: int = TOP_USERS):
+    # Bars of consecutive periods are summed up when there are more than MAX_POINTS.
+    activity = activity_series(chat, granularity, top_n)
+    periods_per_bar = -(-len(activity) // MAX_POINTS)
+    if periods_per_bar > 1:
+        activity = activity.groupby(np.arange(len(activity)) // periods_per_bar).sum().set_axis(activity.index[::periods_per_bar])
+
+    x = activity.index.name
+    activity = activity.loc[activity.sum(axis=1) > 0, activity.sum() > 0]
     return transparent_fig(
         px.bar(
-            message_activity_stack(df),
-            x="month_year",
+            activity.reset_index().melt(id_vars=x, var_name="user", value_name="message_count"),
+            x=x,
             y="message_count",
             color="user",
-            title="Monthly Activity Stacked",
+            title=f"{GRANULARITY_TITLES[granularity]} Activity Stacked" + (f" ({periods_per_bar} {granularity}s per bar)" if periods_per_bar > 1 else ""),
+            color_discrete_map=get_color_map(chat),
         )
     )
 
 
-def plot_weekly_activity_group(df: pd.DataFrame):
+@instrumented
+def plot_weekly_activity_group(chat: ChatAggregates):
     return transparent_fig(
         px.bar(
-            weekly_activity(df),
+            weekly_activity(chat),
             x="weekday",
             y="count",
             title="Group Activity per Weekday",
@@ -96,10 +155,11 @@ def plot_weekly_activity_group(df: pd.DataFrame):
     )
 
 
-def plot_sentiment_ratios(df: pd.DataFrame):
+@instrumented
+def plot_sentiment_ratios(chat: ChatAggregates):
     return transparent_fig(
         px.bar(
-            sentiment_counts(df),
+            sentiment_counts(chat),
             x="sender_name",
             y="ratio",
             color="sentiment",
@@ -117,11 +177,12 @@ def plot_sentiment_ratios(df: pd.DataFrame):
     )
 
 
-def plot_emoji_density(df: pd.DataFrame):
-    color_map = get_color_map(df)
+@instrumented
+def plot_emoji_density(chat: ChatAggregates):
+    color_map = get_color_map(chat)
     return transparent_fig(
         px.treemap(
-            emoji_density(df),
+            emoji_density(chat),
             path=["sender_name"],
             values="count",
             title="Emoji Density per User",
@@ -131,10 +192,14 @@ def plot_emoji_density(df: pd.DataFrame):
     )
 
 
-def plot_mentions_heatmap(df: pd.DataFrame, alias_dict: dict = None):
+@instrumented
+def plot_mentions_heatmap(chat: ChatAggregates):
+    senders, mentions, _ = mention_matrices(chat)
     return transparent_fig(
         px.imshow(
-            count_mentions(df, alias_dict=alias_dict),
+            mentions,
+            x=senders,
+            y=senders,
             labels=dict(y="Mentioned User", x="Sender", color="Mentions"),
             color_continuous_scale="Plasma",
             aspect="auto",
@@ -143,10 +208,14 @@ def plot_mentions_heatmap(df: pd.DataFrame, alias_dict: dict = None):
     )
 
 
-def plot_direct_mentions_heatmap(df: pd.DataFrame, alias_dict: dict = None):
+@instrumented
+def plot_direct_mentions_heatmap(chat: ChatAggregates):
+    senders, _, direct_mentions = mention_matrices(chat)
     return transparent_fig(
         px.imshow(
-            count_mentions(df, direction_mentions=True, alias_dict=alias_dict),
+            direct_mentions,
+            x=senders,
+            y=senders,
             labels=dict(y="@ User", x="Sender", color="Mentions"),
             color_continuous_scale="Plasma",
             aspect="auto",
@@ -155,10 +224,95 @@ def plot_direct_mentions_heatmap(df: pd.DataFrame, alias_dict: dict = None):
     )
 
 
-def plot_message_type_distribution(df: pd.DataFrame, type_label: str, title: str):
-    df_type = message_type_distribution(df)
+@instrumented
+def plot_activity_heatmap(chat: ChatAggregates, user: str = None):
+    return transparent_fig(
+        px.imshow(
+            activity_heatmap(chat, user=user),
+            labels=dict(x="Hour (UTC)", y="Weekday", color="Messages"),
+            color_continuous_scale="Plasma",
+            aspect="auto",
+            title="Activity per Hour and Weekday" + (f" for {user}" if user else ""),
+        )
+    )
+
+
+@instrumented
+def plot_reply_latency(chat: ChatAggregates, top_n: int = TOP_USERS):
+    return transparent_fig(
+        px.line(
+            reply_latency(chat, top_n=top_n),
+            x="latency",
+            y="share",
+            color="sender_name",
+            color_discrete_map=get_color_map(chat),
+            markers=True,
+            hover_data=["count"],
+            title="Reply Latency",
+            labels={"latency": "Time to Reply", "share": "Share of Replies", "sender_name": "User", "count": "Replies"},
+        )
+    )
+
+
+@instrumented
+def plot_reply_matrix(chat: ChatAggregates):
+    return transparent_fig(
+        px.imshow(
+            reply_matrix(chat),
+            labels=dict(y="Replier", x="Replied To", color="Replies"),
+            color_continuous_scale="Plasma",
+            aspect="auto",
+            title="Who Replies to Whom",
+        )
+    )
+
+
+@instrumented
+def plot_conversation_sessions(chat: ChatAggregates):
+    return transparent_fig(
+        px.bar(
+            conversation_sessions(chat),
+            x="month_year",
+            y="sessions",
+            hover_data=["messages_per_session", "minutes_per_session"],
+            title="Conversations per Month",
+            labels={
+                "month_year": "Month",
+                "sessions": "Conversations",
+                "messages_per_session": "Messages per Conversation",
+                "minutes_per_session": "Minutes per Conversation",
+            },
+        )
+    )
+
+
+@instrumented
+def plot_conversation_starters(chat: ChatAggregates):
+    return transparent_fig(
+        px.bar(
+            conversation_starters(chat),
+            x="sender_name",
+            y="count",
+            color="sender_name",
+            color_discrete_map=get_color_map(chat),
+            title="Conversation Starters",
+            labels={"sender_name": "User", "count": "Conversations Started"},
+        )
+    )
+
+
+def top_sender(df: pd.DataFrame, column: str) -> str | None:
+    # None when nobody sent such a message, e.g. within a selection of months and senders.
+    if df.empty or df[column].sum() == 0:
+        return None
+    return df.loc[df[column].idxmax(), "sender_name"]
+
+
+@instrumented
+def plot_message_type_distribution(chat: ChatAggregates, type_label: str, title: str):
+    df_type = message_type_distribution(chat)
     filtered = df_type[df_type["message_type_label"] == type_label]
-    color_map = get_color_map(df)
+    color_map = get_color_map(chat)
     
     fig = px.pie(
         filtered,
@@ -173,13 +327,14 @@ def plot_message_type_distribution(df: pd.DataFrame, type_label: str, title: str
     
     return (
         transparent_fig(fig),
-        filtered.loc[filtered["count"].idxmax(), "sender_name"],
+        top_sender(filtered, "count"),
     )
 
 
-def plot_link_distribution(df: pd.DataFrame):
-    link_dist_df = count_link_messages(df)
-    color_map = get_color_map(df)
+@instrumented
+def plot_link_distribution(chat: ChatAggregates):
+    link_dist_df = count_link_messages(chat)
+    color_map = get_color_map(chat)
     
     fig = px.pie(
         link_dist_df,
@@ -194,19 +349,21 @@ def plot_link_distribution(df: pd.DataFrame):
     
     return (
         transparent_fig(fig),
-        link_dist_df.loc[link_dist_df["link_message_count"].idxmax(), "sender_name"],
+        top_sender(link_dist_df, "link_message_count"),
     )
 
 
-def plot_monthly_sentiment_line(df: pd.DataFrame, average: bool = False):
-    df_sentiment = monthly_sentiment_score(df, average=average)
+@instrumented
+def plot_monthly_sentiment_line(chat: ChatAggregates, average: bool = False, top_n: int = TOP_USERS, trend: str = None):
+    scores = monthly_sentiment_score(chat, average=average, top_n=top_n, trend=trend, window=TREND_SPAN).pivot(index="month_year", columns="sender_name", values="sentiment_score")
     return transparent_fig(
         px.line(
-            df_sentiment,
+            long_series(scores, "sentiment_score").dropna().rename(columns={"user": "sender_name"}),
             x="month_year",
             y="sentiment_score",
             color="sender_name",
-            title="Sentiments over Time" + (" Average" if average else " per User"),
+            render_mode="webgl",
+            title="Sentiments over Time" + (" Average" if average else " per User") + (f" ({TREND_SPAN}-Month Trend)" if trend else ""),
             labels={
                 "month_year": "Month",
                 "ratio": "Sentiment Ratio",
@@ -217,8 +374,9 @@ def plot_monthly_sentiment_line(df: pd.DataFrame, average: bool = False):
     )
 
 
-def plot_user_weekly_activity(df: pd.DataFrame, user: str):
-    user_weekly_df = weekly_activity(df, user=user)
+@instrumented
+def plot_user_weekly_activity(chat: ChatAggregates, user: str):
+    user_weekly_df = weekly_activity(chat, user=user)
     return transparent_fig(
         px.bar(
             user_weekly_df, x="weekday", y="count", title=f"Weekly Activity for {user}"
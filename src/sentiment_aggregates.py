@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+SENTIMENTS = ["positive", "negative", "neutral"]
+# Last axis of a sentiment array: the messages of every sentiment and the sum of their
+# polarity scores. Every metric below is derived from these four sums, so new ones (and
+# any selection of senders or months) never go back to the messages.
+FIELDS = [*SENTIMENTS, "score_sum"]
+POSITIVE, NEGATIVE, NEUTRAL, SCORE_SUM = range(len(FIELDS))
+
+
+def sentiment_array(shape: tuple, sender_codes: np.ndarray, month_codes: np.ndarray, sentiments: pd.Series, scores: pd.Series = None) -> np.ndarray:
+    # sender x month x FIELDS sums of the labelled messages, in one float64 array so that
+    # counts and score sums are merged, sliced and reduced together.
+    sentiment_codes = sentiments.map({sentiment: i for i, sentiment in enumerate(SENTIMENTS)})
+    labelled = sentiment_codes.notna().to_numpy()
+    cells = np.ravel_multi_index((sender_codes[labelled], month_codes[labelled]), shape)
+    n_cells = int(np.prod(shape))
+
+    array = np.zeros((n_cells, len(FIELDS)))
+    codes = cells * len(SENTIMENTS) + sentiment_codes[labelled].to_numpy(dtype=np.intp)
+    array[:, :SCORE_SUM] = np.bincount(codes, minlength=n_cells * len(SENTIMENTS)).reshape(n_cells, len(SENTIMENTS))
+    if scores is not None:
+        array[:, SCORE_SUM] = np.bincount(cells, weights=np.nan_to_num(scores.to_numpy(dtype=np.float64)[labelled]), minlength=n_cells)
+    return array.reshape(*shape, len(FIELDS))
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # NaN where there is nothing to divide by, e.g. months without a labelled message.
+    return np.divide(numerator, denominator, out=np.full(np.shape(numerator), np.nan), where=denominator > 0)
+
+
+def positive_share(sentiments: np.ndarray) -> np.ndarray:
+    # Positive messages among the positive and negative ones, neutral ones do not count.
+    return _ratio(sentiments[..., POSITIVE], sentiments[..., POSITIVE] + sentiments[..., NEGATIVE])
+
+
+def negative_share(sentiments: np.ndarray) -> np.ndarray:
+    return _ratio(sentiments[..., NEGATIVE], sentiments[..., POSITIVE] + sentiments[..., NEGATIVE])
+
+
+def mean_polarity(sentiments: np.ndarray) -> np.ndarray:
+    # Average score of all labelled messages, neutral ones included.
+    return _ratio(sentiments[..., SCORE_SUM], sentiments[..., :SCORE_SUM].sum(axis=-1))
+
+
+def rolling(sentiments: np.ndarray, window: int) -> np.ndarray:
+    # Sums over the last `window` months (fewer at the start) along the month axis, which
+    # holds consecutive months. The metrics of the result are weighted by the messages of
+    # each month.
+    sums = np.cumsum(sentiments, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    return sums
+
+
+def ema(sentiments: np.ndarray, span: int) -> np.ndarray:
+    # Exponentially weighted sums along the (consecutive) month axis, older months decaying by
+    # 1 - 2 / (span + 1) per month. One step per month, vectorized over senders and fields.
+    decay = 1 - 2 / (span + 1)
+    sums = np.array(sentiments, dtype=np.float64)
+    for month in range(1, sums.shape[1]):
+        sums[:, month] += decay * sums[:, month - 1]
+    return sums
+
+
+METRICS = {
+    "positive_share": positive_share,
+    "negative_share": negative_share,
+    "mean_polarity": mean_polarity,
+}
+TRENDS = {
+    "rolling": rolling,
+    "ema": ema,
+}
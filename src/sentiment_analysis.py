@@ -1,56 +1,205 @@
 import argparse
-from joblib import Parallel, delayed
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
 import pandas as pd
-from textblob_de import TextBlobDE
-from textblob import TextBlob
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
+from importlib import metadata
 from tqdm import tqdm
+from cache import CACHE_DIR
 
 
-tqdm.pandas()
+SENTIMENT_THRESHOLD = 0.666
 
+# Built once per worker process by init_worker, reused for every batch it scores.
+classifier = None
 
-def analyze_sentiment(classifer, text: str):
-    if not isinstance(text, str) or text.strip() == "":
-        return ("neutral", 0.0)
-    blob = classifer(text)
-    score = blob.sentiment.polarity
-    if score >= 0.666:
-        return ("positive", score)
-    elif score <= -0.666:
-        return ("negative", score)
-    else:
-        return ("neutral", score)
-    
-
-def get_message_sentiments(df: pd.DataFrame, out_path: str, language: str) -> pd.DataFrame:
-    classifiers = {
-        "german": TextBlobDE,
-        "english": TextBlob
-    }
-    
-    classifier = classifiers.get(language, TextBlob)
-        
-    results = Parallel(n_jobs=8)(
-        delayed(analyze_sentiment)(classifier, text) for text in tqdm(df["text_data"])
+
+def load_classifier(language: str):
+    # Blobbers share one analyzer and tokenizer across all texts, unlike a new TextBlob per text.
+    if language == "german":
+        from textblob_de import BlobberDE
+        return BlobberDE()
+
+    from textblob import Blobber
+    return Blobber()
+
+
+def init_worker(language: str):
+    global classifier
+    classifier = load_classifier(language)
+
+
+def score_batch(texts: list[str]) -> list[float]:
+    return [classifier(text).sentiment.polarity for text in texts]
+
+
+def label_scores(scores: np.ndarray) -> np.ndarray:
+    return np.select(
+        [scores >= SENTIMENT_THRESHOLD, scores <= -SENTIMENT_THRESHOLD],
+        ["positive", "negative"],
+        "neutral",
     )
-    
-    sentiment_df = pd.DataFrame(results, index=df.index, columns=["sentiment", "score"])
 
-    df = df.copy()
-    df[["sentiment", "score"]] = sentiment_df
-    
+
+@contextmanager
+def scoring_pool(language: str, n_jobs: int):
+    # Yields the map function to score chunks with, both keep the order of the chunks.
+    if n_jobs == 1:
+        init_worker(language)
+        yield map
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=(language,)) as pool:
+        yield pool.map
+
+
+def classifier_version(language: str) -> str:
+    package = "textblob-de" if language == "german" else "textblob"
+    return f"{package}-{metadata.version(package)}"
+
+
+def checkpoint_path(language: str, cache_dir: str = CACHE_DIR) -> str:
+    # Scores of another language or classifier version live in a checkpoint of their own.
+    return os.path.join(cache_dir, f"sentiments-{language}-{classifier_version(language)}.sqlite")
+
+
+def text_keys(texts: pd.Series) -> pd.Series:
+    return "text:" + texts.astype(str).map(lambda text: hashlib.blake2b(text.encode(), digest_size=16).hexdigest())
+
+
+def message_keys(df: pd.DataFrame) -> pd.Series:
+    # The key_id of a message when exported, the hash of its text otherwise.
+    if "key_id" not in df.columns:
+        return text_keys(df["text_data"])
+
+    keys = "id:" + df["key_id"].astype(str)
+    no_id = df["key_id"].isna()
+    keys[no_id] = text_keys(df.loc[no_id, "text_data"])
+    return keys
+
+
+CHECKPOINT_SCHEMA = "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL NOT NULL) WITHOUT ROWID"
+
+
+def open_checkpoint(path: str) -> sqlite3.Connection:
+    # Scores are looked up per block of messages by key, so memory does not grow with the
+    # number of messages scored so far. Every committed batch survives an interrupted run.
+    connection = sqlite3.connect(path)
+    connection.execute(CHECKPOINT_SCHEMA)
+    connection.execute("CREATE TEMP TABLE block_keys (key TEXT PRIMARY KEY) WITHOUT ROWID")
+    import_csv_checkpoint(connection, os.path.splitext(path)[0] + ".csv")
+    return connection
+
+
+def import_csv_checkpoint(connection: sqlite3.Connection, path: str, chunksize: int = 100_000):
+    # Checkpoints used to be csv files of key,score lines, their scores are moved over once.
+    if not os.path.exists(path):
+        return
+
+    # A run killed mid-write leaves a partial last line, cut it before reading the file.
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 4096))
+        tail = f.read()
+        f.truncate(size - len(tail) + tail.rfind(b"\n") + 1 if b"\n" in tail else 0)
+
+    if os.path.getsize(path) > 0:
+        for chunk in pd.read_csv(path, names=["key", "score"], float_precision="round_trip", chunksize=chunksize):
+            write_scores(connection, chunk["key"], chunk["score"])
+    os.remove(path)
+
+
+def read_scores(connection: sqlite3.Connection, keys: np.ndarray) -> pd.Series:
+    # Checkpointed scores of the given keys, indexed by key.
+    connection.execute("DELETE FROM block_keys")
+    connection.executemany("INSERT OR IGNORE INTO block_keys VALUES (?)", zip(keys))
+    found = connection.execute("SELECT key, score FROM scores JOIN block_keys USING (key)").fetchall()
+    return pd.Series(dict(found), dtype=np.float64)
+
+
+def write_scores(connection: sqlite3.Connection, keys, scores):
+    connection.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?)", zip(keys, map(float, scores)))
+    connection.commit()
+
+
+def score_frames(frames, language: str, n_jobs: int = None, chunk_size: int = 5_000, cache_dir: str = CACHE_DIR):
+    # Adds sentiment and score to every frame, one pool and checkpoint serve all of them.
+    path = checkpoint_path(language, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    n_scored, n_texts, n_cached = 0, 0, 0
+
+    start = time.perf_counter()
+    with scoring_pool(language, n_jobs or os.cpu_count()) as pool_map, closing(open_checkpoint(path)) as checkpoint:
+        for df in frames:
+            # Missing, non-string and blank texts are neutral without being sent to a worker.
+            texts = df["text_data"].astype(object)
+            has_text = texts.str.strip().fillna("").ne("").to_numpy()
+            keys = message_keys(df[has_text])
+            cached = read_scores(checkpoint, keys.unique())
+
+            # Only messages not scored by an earlier (possibly interrupted) run, each key once.
+            unseen = ~keys.isin(cached.index) & ~keys.duplicated()
+            # Messages repeating a text are scored once, the score is checkpointed under all their
+            # keys. Keys are ordered by text so that those of a chunk of texts are a slice.
+            text_codes, unseen_texts = pd.factorize(texts[has_text][unseen.to_numpy()])
+            order = np.argsort(text_codes, kind="stable")
+            unseen_keys, text_codes = keys[unseen].to_numpy()[order], text_codes[order]
+            unseen_texts = unseen_texts.tolist()
+            chunks = [unseen_texts[i:i + chunk_size] for i in range(0, len(unseen_texts), chunk_size)]
+            bounds = np.searchsorted(text_codes, np.arange(len(chunks) + 1) * chunk_size)
+
+            scored = [cached]
+            for i, batch in enumerate(tqdm(pool_map(score_batch, chunks), total=len(chunks))):
+                batch_keys = unseen_keys[bounds[i]:bounds[i + 1]]
+                batch_scores = np.array(batch)[text_codes[bounds[i]:bounds[i + 1]] - i * chunk_size]
+                write_scores(checkpoint, batch_keys, batch_scores)
+                scored.append(pd.Series(batch_scores, index=batch_keys))
+
+            n_scored += int(unseen.sum())
+            n_texts += len(unseen_texts)
+            n_cached += int(has_text.sum() - unseen.sum())
+
+            scores = np.zeros(len(df))
+            scores[has_text] = keys.map(pd.concat(scored)).to_numpy()
+            yield df.assign(sentiment=label_scores(scores), score=scores)
+
+    elapsed = time.perf_counter() - start
+    seconds = max(elapsed, 1e-9)
+    print(f"Scored {n_scored} new messages ({n_texts} distinct texts) in {elapsed:.1f}s ({n_scored / seconds:.0f} messages/s, {n_texts / seconds:.0f} texts/s), {n_cached} from {path}")
+
+
+def get_message_sentiments(df: pd.DataFrame, out_path: str, language: str, n_jobs: int = None, chunk_size: int = 5_000, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    [df] = score_frames([df], language, n_jobs, chunk_size, cache_dir)
     df.to_csv(out_path, index=False)
-    
+
     return df
 
 
+def stream_message_sentiments(in_path: str, out_path: str, language: str, read_size: int, n_jobs: int = None, chunk_size: int = 5_000, cache_dir: str = CACHE_DIR):
+    # Reads, scores and writes `read_size` rows at a time for exports larger than memory.
+    frames = pd.read_csv(in_path, chunksize=read_size)
+    for i, df in enumerate(score_frames(frames, language, n_jobs, chunk_size, cache_dir)):
+        df.to_csv(out_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Sentiment analysis of chat data.")
     parser.add_argument("--language", type=str, default="english", choices=["english", "german"], help="Language of the text data")
     parser.add_argument("--input", type=str, default="./data/group-chat.csv", help="Path to input CSV file")
     parser.add_argument("--output", type=str, default="./data/group-chat-sentiments.csv", help="Path to output CSV file")
-    
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=5_000, help="Number of messages scored per task")
+    parser.add_argument("--cache-dir", type=str, default=CACHE_DIR, help="Directory of the per-message score checkpoints")
+    parser.add_argument("--read-size", type=int, default=None, help="Stream the input in blocks of this many rows instead of loading it at once")
+
     args = parser.parse_args()
 
-    df = pd.read_csv(args.input)
-    get_message_sentiments(df, out_path=args.output, language=args.language)
+    if args.read_size:
+        stream_message_sentiments(args.input, args.output, args.language, args.read_size, n_jobs=args.cores, chunk_size=args.chunk_size, cache_dir=args.cache_dir)
+    else:
+        df = pd.read_csv(args.input)
+        get_message_sentiments(df, out_path=args.output, language=args.language, n_jobs=args.cores, chunk_size=args.chunk_size, cache_dir=args.cache_dir)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from cache import read_cache, write_cache
+from instrumentation import instrumented
+from parallel import map_partitions
+from utils import EMOJI_CLUSTER_PATTERN, expand_emoji_clusters
+
+
+EMOJI_LIST_TYPE = pa.list_(pa.string())
+
+
+@instrumented
+def text_features(texts: pd.Series) -> pd.DataFrame:
+    # Columns that only depend on the text of a message, shared by all aggregations.
+    text = texts.astype(str)
+    emojis = text.str.findall(EMOJI_CLUSTER_PATTERN).map(expand_emoji_clusters)
+
+    return pd.DataFrame({
+        "message_length": text.str.len().astype(np.int32),
+        "emojis": pd.arrays.ArrowExtensionArray(pa.array(emojis.tolist(), type=EMOJI_LIST_TYPE)),
+        "emoji_count": emojis.str.len().astype(np.int32),
+        "has_link": texts.str.contains(r"https?://", case=False, na=False).astype(bool),
+    }, index=texts.index)
+
+
+# Features of a message without text, the same for all of them.
+MISSING_TEXT_FEATURES = text_features(pd.Series([np.nan], dtype=object))
+
+
+class TextFeatures:
+    # Features of the distinct texts seen so far, indexed by the text itself. Chats repeat
+    # the same short texts ("ok", "haha", sticker captions) over and over, each of them is
+    # only analysed the first time and its features are copied to all messages by the code
+    # of their text. With a path the table is kept on disk, so that a new export of a chat
+    # only analyses the texts that were not in the previous one.
+
+    def __init__(self, path: str = None):
+        self.path = path
+        table = read_cache(path) if path else None
+        if table is None:
+            table = text_features(pd.Series([], dtype=object)).assign(text=pd.Series([], dtype=object))
+        self.table = table.set_index("text")
+        self.new_texts = 0
+
+    @instrumented
+    def derived_columns(self, texts: pd.Series, n_jobs: int = 1) -> pd.DataFrame:
+        codes, uniques = pd.factorize(texts)
+        positions = self.table.index.get_indexer(uniques)
+
+        unseen = positions < 0
+        if unseen.any():
+            new_texts = pd.Series(uniques[unseen], index=uniques[unseen], dtype=object)
+            self.table = pd.concat([self.table, *map_partitions(text_features, new_texts, n_jobs)])
+            positions[unseen] = np.arange(len(self.table) - unseen.sum(), len(self.table))
+            self.new_texts += int(unseen.sum())
+
+        # The features of missing texts (code -1) follow those of the distinct texts.
+        features = pd.concat([self.table.iloc[positions], MISSING_TEXT_FEATURES], ignore_index=True)
+        return features.take(np.where(codes < 0, len(uniques), codes)).set_axis(texts.index)
+
+    def save(self):
+        # Only written when something was added. Texts of earlier exports are kept, a chat
+        # mostly grows so they are seen again.
+        if self.path and self.new_texts:
+            write_cache(self.table.rename_axis("text").reset_index(), self.path)
+            self.new_texts = 0
@@ -1,6 +1,28 @@
+import importlib.util
 import json
+import re
+import sys
 import emoji
 import plotly.graph_objs as go
+from functools import lru_cache
+
+
+def lazy_import(name: str):
+    # The module is only executed on the first access to one of its attributes, for heavy
+    # imports that a process may not need right away (or at all).
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
 
 
 def load_json(path: str) -> dict:
@@ -8,9 +30,64 @@ def load_json(path: str) -> dict:
         return json.load(f)
     
 
+def char_class(chars, max_gap: int = 16) -> str:
+    # Collapse the code points into a few coarse ranges. `re` checks astral ranges one
+    # by one, so a class listing every emoji is slower than emoji_list itself. The extra
+    # code points let through by the gaps are dropped again in split_emoji_cluster.
+    ranges = []
+    for code in sorted(map(ord, set(chars))):
+        if ranges and code <= ranges[-1][1] + max_gap:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+
+    return "[" + "".join(
+        re.escape(chr(start)) if start == end else f"{re.escape(chr(start))}-{re.escape(chr(end))}"
+        for start, end in ranges
+    ) + "]"
+
+
+# Matches runs of characters that can form emojis (base emoji followed by modifiers, ZWJ
+# sequences, flags, ...). A run may hold several emojis, split_emoji_cluster resolves it.
+EMOJI_CLUSTER_PATTERN = re.compile(
+    char_class(e[0] for e in emoji.EMOJI_DATA) + char_class(c for e in emoji.EMOJI_DATA for c in e[1:]) + "*"
+)
+
+
+@lru_cache(maxsize=None)
+def split_emoji_cluster(cluster: str) -> tuple[str, ...]:
+    # The emojis of one run, as emoji.emoji_list finds them: ZWJ sequences that continue
+    # past a known emoji are split into their parts, the gaps of the character classes are
+    # dropped. Runs repeat a lot, so this only runs once per distinct one.
+    return tuple(match["emoji"] for match in emoji.emoji_list(cluster))
+
+
+def expand_emoji_clusters(clusters: list[str]) -> list[str]:
+    return [e for cluster in clusters for e in split_emoji_cluster(cluster)]
+
+
 def extract_emojis(text) -> list[str]:
-    text = str(text)
-    return [match["emoji"] for match in emoji.emoji_list(text)]
+    return expand_emoji_clusters(EMOJI_CLUSTER_PATTERN.findall(str(text)))
+
+
+def trie_pattern(words) -> str:
+    # Alternation of all words, nested by common prefix so that `re` only follows the
+    # branches matching the next character instead of trying every word in turn.
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_pattern(node: dict) -> str:
+        branches = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return to_pattern(trie)
 
 
 def transparent_fig(fig: go.Figure):
@@ -0,0 +1,13 @@
+import gc
+from dashboard import app, warm_up
+
+
+# Entry point of gunicorn (see gunicorn.conf.py). With preload_app this module is imported
+# once in the master, the workers are forked from it with the data already prepared.
+warm_up()
+
+# The garbage collector of a worker would otherwise write to every object it inherited
+# while looking for cycles, copying their pages.
+gc.freeze()
+
+server = app.server
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+
+# The modules in src import each other by their plain names, like when run as scripts.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+from benchmark import write_synthetic_export
+from data import prepare_data
+
+
+@pytest.fixture(scope="session")
+def export(tmp_path_factory):
+    # (path, config) of a small synthetic group-chat.csv over several years, with aliases,
+    # mentions, emojis, links and sentiments.
+    return write_synthetic_export(str(tmp_path_factory.mktemp("export")), 3000, members=6, mention_rate=0.2)
+
+
+@pytest.fixture(scope="session")
+def frame(export):
+    path, config = export
+    return prepare_data(config, path, use_cache=False)
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+import data
+from aggregates import ChatAggregates
+from utils import MESSAGE_TYPE_MAP
+from live import LiveChat
+
+
+def outputs(chat: ChatAggregates) -> dict:
+    # What the dashboard shows of the aggregates, rows sorted so that the order in which
+    # senders and months were first seen does not matter.
+    frames = {
+        "message_count": data.message_count(chat),
+        "average_message_length": data.average_message_length(chat),
+        "message_activity": data.message_activity(chat, "*"),
+        "activity_series(month)": data.activity_series(chat, "month").reset_index(),
+        "activity_series(day)": data.activity_series(chat, "day").reset_index(),
+        "weekly_activity": data.weekly_activity(chat),
+        "activity_heatmap": data.activity_heatmap(chat).reset_index(),
+        "reply_latency": data.reply_latency(chat),
+        "reply_matrix": data.reply_matrix(chat).reset_index(),
+        "conversation_sessions": data.conversation_sessions(chat),
+        "conversation_starters": data.conversation_starters(chat),
+        "emoji_density": data.emoji_density(chat),
+        "sentiment_counts": data.sentiment_counts(chat),
+        "monthly_sentiment_score": data.monthly_sentiment_score(chat),
+        "count_link_messages": data.count_link_messages(chat),
+        "count_mentions": data.count_mentions(chat).sort_index().sort_index(axis=1).reset_index(),
+        "count_mentions(direct)": data.count_mentions(chat, True).sort_index().sort_index(axis=1).reset_index(),
+        "message_type_distribution": data.message_type_distribution(chat),
+    }
+    frames = {name: df.sort_values(list(df.columns)).reset_index(drop=True) for name, df in frames.items()}
+    frames["emojis"] = {sender: dict(counter) for sender, counter in chat.emojis.items()}
+    frames["monthly_emojis"] = {key: dict(counter) for key, counter in chat.monthly_emojis.items()}
+    return frames
+
+
+def assert_same_outputs(actual: dict, expected: dict):
+    for name, value in expected.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(actual[name], value, check_dtype=False, obj=name)
+        else:
+            assert actual[name] == value, name
+
+
+@pytest.fixture(scope="module")
+def single_pass(frame, export):
+    return ChatAggregates.from_frame(frame, export[1]["senderAliases"])
+
+
+@pytest.mark.parametrize("chunks", [2, 7])
+def test_merged_chunks_equal_a_single_pass(frame, export, single_pass, chunks):
+    # Chunks in time order, a conversation may run across the border of two of them.
+    chat = ChatAggregates(export[1]["senderAliases"])
+    for rows in np.array_split(np.arange(len(frame)), chunks):
+        df = frame.iloc[rows]
+        chat.merge(ChatAggregates(export[1]["senderAliases"]).count(df))
+
+    assert_same_outputs(outputs(chat), outputs(single_pass))
+
+
+def test_partitions_equal_a_single_pass(frame, export, single_pass):
+    assert_same_outputs(outputs(ChatAggregates.from_frame(frame, export[1]["senderAliases"], n_jobs=2)), outputs(single_pass))
+
+
+def test_streamed_chunks_equal_a_single_pass(export, single_pass):
+    path, config = export
+    live_chat = LiveChat({**config, "streamChunkSize": 700}, path)
+
+    assert_same_outputs(outputs(live_chat.chat), outputs(single_pass))
+
+
+def test_refresh_after_appending_equals_a_single_pass(export, single_pass, tmp_path):
+    path, config = export
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    partial_path = str(tmp_path / "group-chat.csv")
+    with open(partial_path, "wb") as f:
+        f.writelines(lines[:1200])
+
+    live_chat = LiveChat(config, partial_path)
+    with open(partial_path, "ab") as f:
+        f.writelines(lines[1200:])
+
+    assert live_chat.refresh()
+    assert_same_outputs(outputs(live_chat.chat), outputs(single_pass))
+    assert not live_chat.refresh()
+
+
+def recount(frame: pd.DataFrame, *keys) -> pd.Series:
+    return frame[frame["sender_name"].notna()].groupby(list(keys), observed=True).size()
+
+
+def test_cube_counts_equal_a_recount(frame, single_pass):
+    timestamps = pd.to_datetime(frame["timestamp"], unit="ms")
+    frame = frame.assign(weekday=timestamps.dt.day_name(), hour=timestamps.dt.hour, date=timestamps.dt.normalize())
+
+    counts = data.message_count(single_pass).set_index("sender_name")["count"]
+    assert counts.sort_index().to_dict() == recount(frame, "sender_name").sort_index().to_dict()
+
+    weekly = data.weekly_activity(single_pass).set_index("weekday")["count"]
+    assert {str(day): count for day, count in weekly.items()} == recount(frame, "weekday").to_dict()
+
+    sender = counts.index[1]
+    heatmap = data.activity_heatmap(single_pass, sender).stack()
+    expected = recount(frame[frame["sender_name"] == sender], "weekday", "hour")
+    assert heatmap[heatmap > 0].to_dict() == expected.to_dict()
+
+    daily = data.activity_series(single_pass, "day").sum(axis=1)
+    assert daily[daily > 0].to_dict() == recount(frame, "date").to_dict()
+
+
+def test_message_types_equal_a_recount(frame, single_pass):
+    types = frame.assign(message_type_label=frame["message_type"].astype(str).map(MESSAGE_TYPE_MAP)).dropna(subset="message_type_label")
+    expected = recount(types, "sender_name", "message_type_label")
+
+    distribution = data.message_type_distribution(single_pass).set_index(["sender_name", "message_type_label"])["count"]
+    assert distribution.to_dict() == expected.to_dict()
+
+
+# Conversations are joined over the messages of everyone and across the borders of the
+# selection, a view keeps those of the whole chat.
+CONVERSATION_OUTPUTS = ["reply_latency", "reply_matrix", "conversation_sessions", "conversation_starters"]
+
+
+@pytest.mark.parametrize("start, end, senders", [
+    ("2016-03", "2017-10", None),
+    (None, "2016-12", ["member_0", "member_2"]),
+    ("2018-01", None, ["member_1", "Other"]),
+])
+def test_selection_equals_a_recount(frame, export, single_pass, start, end, senders):
+    months = frame["month_year"].astype(str)
+    keep = (months >= (start or "")) & (months <= (end or "9999"))
+    if senders is not None:
+        keep &= frame["sender_name"].isin(senders)
+    expected = outputs(ChatAggregates.from_frame(frame[keep], export[1]["senderAliases"]))
+    actual = outputs(single_pass.select(start, end, senders))
+
+    for name in CONVERSATION_OUTPUTS:
+        del expected[name], actual[name]
+    # The view spans all days of its months, also those without messages of its senders.
+    daily = actual["activity_series(day)"]
+    actual["activity_series(day)"] = daily[daily["date"].between(*expected["activity_series(day)"]["date"].agg(["min", "max"]))].reset_index(drop=True)
+    assert_same_outputs(actual, expected)
@@ -0,0 +1,48 @@
+import plotly.graph_objs as go
+from figure_cache import FigureCache
+from instrumentation import Metrics
+
+
+class Chat:
+    def __init__(self, token: int, version: int):
+        self.token, self.version = token, version
+
+
+def plot(chat, title):
+    return go.Figure(layout={"title": title})
+
+
+def test_figures_cached_in_a_job_are_merged_into_the_server():
+    server, job = FigureCache(), FigureCache()
+    # Forked from the server, the job starts with the same entries.
+    for cache in (server, job):
+        cache(plot, Chat(1, 0), "a")
+
+    state = job.state()
+    job(plot, Chat(1, 0), "a")
+    job(plot, Chat(1, 0), "b")
+    job(plot, Chat(2, 0), "c")
+    delta = job.delta(state)
+    assert [key[-2] for key, _, _ in delta["entries"]] == [("b",), ("c",)]
+    assert (delta["hits"], delta["misses"]) == (1, 2)
+
+    # Chat 2 got new messages in the server meanwhile, the figure of the job is outdated.
+    server(plot, Chat(2, 1), "d")
+    server.merge(delta)
+    assert [key[-2] for key in server.entries] == [("a",), ("d",), ("b",)]
+    assert (server.hits, server.misses) == (1, 4)
+
+    server(plot, Chat(1, 0), "b")
+    assert server.hits == 2
+
+
+def test_metrics_of_a_job_add_up_with_those_of_the_server():
+    server, job = Metrics(), Metrics()
+    server.record("f", 1.0, 0.5, 10, None)
+    job.record("f", 2.0, 1.0, 5, None)
+    job.record("g", 0.5, 0.5, None, 64)
+
+    server.merge(job.snapshot())
+    stats = server.snapshot()
+    assert stats["f"] == {"calls": 2, "wall_seconds": 3.0, "max_wall_seconds": 2.0, "cpu_seconds": 1.5, "rows": 15, "peak_bytes": 0}
+    assert stats["g"]["calls"] == 1 and stats["g"]["peak_bytes"] == 64
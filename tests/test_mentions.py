@@ -0,0 +1,58 @@
+import re
+import pandas as pd
+import pytest
+import data
+from aggregates import ChatAggregates, scan_mentions
+
+
+def reference_mentions(df: pd.DataFrame, alias_dict: dict, direction_mentions: bool = False) -> pd.DataFrame:
+    # The counting that scan_mentions replaced: one regex per pair of users over the texts of
+    # the sender, [mentioned, sender].
+    def normalize_name(name):
+        name = str(name).lower().strip()
+        for canonical, aliases in alias_dict.items():
+            if name == canonical or name in aliases:
+                return canonical
+        return name
+
+    df = df[df["sender_name"].str.lower() != "other"]
+    normalized = df["sender_name"].apply(normalize_name)
+    senders = normalized.dropna().unique()
+    mention_counts = {sender: {other: 0 for other in senders} for sender in senders}
+    for sender in senders:
+        sender_msgs = df[normalized == sender]["text_data"].dropna().astype(str)
+        for mentioned in senders:
+            if mentioned == sender:
+                continue
+            aliases = alias_dict.get(mentioned, [])
+            all_names = [a for a in aliases if a.isdigit()] if direction_mentions else [mentioned, *aliases]
+            if not all_names:
+                continue
+            pattern = re.compile(r"\b(" + "|".join(map(re.escape, all_names)) + r")\b", re.IGNORECASE)
+            mention_counts[sender][mentioned] = sender_msgs.str.count(pattern).sum()
+
+    return pd.DataFrame(mention_counts)
+
+
+@pytest.mark.parametrize("direction_mentions", [False, True])
+def test_mentions_equal_one_regex_per_pair(frame, export, direction_mentions):
+    alias_dict = export[1]["senderAliases"]
+    chat = ChatAggregates.from_frame(frame, alias_dict)
+
+    expected = reference_mentions(frame, alias_dict, direction_mentions)
+    expected = expected.sort_index().sort_index(axis=1)
+    actual = data.count_mentions(chat, direction_mentions).sort_index().sort_index(axis=1)
+    assert actual.to_numpy().sum() > 0
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_shared_aliases_count_for_everyone_they_may_refer_to():
+    alias_dict = {"anna": ["ann", "boss"], "ben": ["boss"], "carl": []}
+    df = pd.DataFrame({
+        "sender_name": ["anna", "ben", "carl", "carl", "Other"],
+        "text_data": ["hi boss", "Ann?", "BOSS, ann and ben", "carl", "anna"],
+    })
+
+    expected = reference_mentions(df, alias_dict)
+    names, mentions, _ = scan_mentions(df, alias_dict)
+    assert mentions[..., 0].tolist() == expected.loc[names, names].to_numpy().tolist()
@@ -0,0 +1,55 @@
+import sqlite3
+from contextlib import closing
+import numpy as np
+import pytest
+from data import MSGSTORE_DTYPES, label_senders, msgstore_jid_names, read_msgstore
+
+
+CHAT = 7
+# (sender_jid_row_id, timestamp, message_type, text_data, sort_id, chat_row_id)
+MESSAGES = [
+    (1, 1_700_000_000_000, 0, "hi", 1, CHAT),
+    (2, 1_700_000_060_000, 0, None, 2, CHAT),
+    (3, 1_700_000_120_000, 1, None, 3, CHAT),
+    (1, 1_700_000_180_000, 0, "other chat", 4, CHAT + 1),
+    (2, 1_700_000_240_000, 0, "later", 5, CHAT),
+]
+JIDS = [(1, "4917000000001"), (2, "4917000000002"), (3, "4917000000003")]
+CONFIG = {"jidMap": {"1": "Alice"}, "other": [], "excludeOther": False}
+
+
+@pytest.fixture
+def msgstore(tmp_path):
+    # The few columns of a decrypted msgstore.db that are read, with two chats in it.
+    path = str(tmp_path / "msgstore.db")
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("CREATE TABLE jid (_id INTEGER PRIMARY KEY, user TEXT)")
+        connection.execute("CREATE TABLE message (_id INTEGER PRIMARY KEY, sender_jid_row_id INTEGER, timestamp INTEGER, message_type INTEGER, text_data TEXT, sort_id INTEGER, chat_row_id INTEGER)")
+        connection.executemany("INSERT INTO jid VALUES (?, ?)", JIDS)
+        connection.executemany("INSERT INTO message (sender_jid_row_id, timestamp, message_type, text_data, sort_id, chat_row_id) VALUES (?, ?, ?, ?, ?, ?)", MESSAGES)
+        connection.commit()
+    return path
+
+
+def test_rows_and_dtypes_of_one_chat(msgstore):
+    df = read_msgstore(msgstore, CHAT)
+
+    assert df["sort_id"].tolist() == [1, 2, 3, 5]
+    assert df["sender_jid_row_id"].tolist() == ["1", "2", "3", "2"]
+    # Missing texts are NaN like in the csv, not None.
+    assert df["text_data"].isna().tolist() == [False, True, True, False]
+    assert None not in df["text_data"].tolist()
+    assert {col: str(dtype) for col, dtype in df.dtypes.items()} == {col: str(np.dtype(dtype)) for col, dtype in MSGSTORE_DTYPES.items()}
+
+
+def test_phone_numbers_name_senders_missing_from_jid_map(msgstore):
+    jid_names = msgstore_jid_names(msgstore, CHAT)
+    df = label_senders(read_msgstore(msgstore, CHAT), CONFIG, jid_names)
+
+    assert df["sender_name"].tolist() == ["Alice", "4917000000002", "4917000000003", "4917000000002"]
+
+
+def test_after_sort_id_only_reads_newer_rows(msgstore):
+    assert read_msgstore(msgstore, CHAT, after_sort_id=2)["sort_id"].tolist() == [3, 5]
+    assert read_msgstore(msgstore, CHAT, after_sort_id=5).empty
+    assert list(read_msgstore(msgstore, CHAT, after_sort_id=5).columns) == list(MSGSTORE_DTYPES)
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+import data
+from aggregates import ChatAggregates
+
+
+@pytest.mark.parametrize("trend", ["rolling", "ema"])
+def test_trends_step_over_calendar_months(frame, export, trend):
+    # Nobody writes for a few months, those still count towards the window.
+    months = frame["month_year"].astype(str)
+    frame = frame[~months.between("2016-02", "2016-05") & frame["sentiment"].notna()]
+    chat = ChatAggregates.from_frame(frame, export[1]["senderAliases"])
+
+    df = frame.assign(month_year=frame["month_year"].astype(str), sender_name=frame["sender_name"].astype(str))
+    calendar = pd.period_range(df["month_year"].min(), df["month_year"].max(), freq="M").astype(str)
+    senders = sorted(df["sender_name"].unique())
+    positive, negative = (
+        pd.crosstab(labelled["month_year"], labelled["sender_name"]).reindex(index=calendar, columns=senders, fill_value=0)
+        for labelled in (df[df["sentiment"] == "positive"], df[df["sentiment"] == "negative"])
+    )
+    if trend == "rolling":
+        positive, negative = positive.rolling(3, min_periods=1).sum(), negative.rolling(3, min_periods=1).sum()
+    else:
+        positive, negative = positive.ewm(span=3).mean(), negative.ewm(span=3).mean()
+    expected = (positive / (positive + negative)).loc[sorted(df["month_year"].unique())].stack()
+
+    scores = data.monthly_sentiment_score(chat, trend=trend, window=3).set_index(["month_year", "sender_name"])["sentiment_score"]
+    assert "2016-03" not in scores.index.get_level_values("month_year")
+    pd.testing.assert_series_equal(scores.sort_index(), expected.dropna().sort_index(), check_names=False)
@@ -0,0 +1,56 @@
+import random
+import emoji
+import numpy as np
+import pandas as pd
+import pytest
+from text_features import TextFeatures, text_features
+from utils import extract_emojis
+
+
+TEXTS = pd.Series(["ok", "haha 😂😂", np.nan, "ok", "see https://example.com 👍🏽", np.nan, "haha 😂😂", ""], dtype=object)
+
+
+def test_derived_columns_equal_the_features_of_every_message():
+    features = TextFeatures()
+    derived = features.derived_columns(TEXTS)
+
+    pd.testing.assert_frame_equal(derived, text_features(TEXTS))
+    assert features.new_texts == 4
+
+
+def test_saved_table_only_analyses_new_texts(tmp_path):
+    path = str(tmp_path / "text-features.feather")
+    features = TextFeatures(path)
+    features.derived_columns(TEXTS[:4])
+    features.save()
+
+    features = TextFeatures(path)
+    derived = features.derived_columns(TEXTS)
+    assert features.new_texts == 2
+    pd.testing.assert_frame_equal(derived, text_features(TEXTS))
+
+
+def test_emojis_of_the_export_equal_emoji_list(frame):
+    texts = frame["text_data"].dropna().astype(str)
+
+    assert texts.map(extract_emojis).tolist() == [[match["emoji"] for match in emoji.emoji_list(text)] for text in texts]
+
+
+@pytest.mark.parametrize("text", [
+    # Known ZWJ sequences continued by another ZWJ, emoji_list splits them into their parts.
+    "\U0001F9CE\U0001F3FB\u200d\u2642\ufe0f\u200d\U0001F6B2",
+    "\U0001F9D1\u200d\U0001F9D1\u200d\U0001F9D2\u200d\U0001F939\U0001F3FF\u200d\u2640\ufe0f",
+    "a\U0001F469\U0001F3FB\u200d\U0001F9BD\u200d",
+])
+def test_zwj_sequences_split_like_emoji_list(text):
+    assert extract_emojis(text) == [match["emoji"] for match in emoji.emoji_list(text)]
+
+
+def test_random_emoji_sequences_split_like_emoji_list():
+    rng = random.Random(0)
+    emojis = list(emoji.EMOJI_DATA)
+    # Joiners, variation selectors, skin tones, keycaps, flag letters and tag characters.
+    parts = ["\u200d", "\ufe0f", "\ufe0e", "\U0001F3FB", "\U0001F3FD", "a", " ", "1", "#", "\u20e3", "\U0001F1E9", "\U0001F1EA", "\U000E0067", "\U000E007F"]
+    for _ in range(3000):
+        text = "".join(rng.choice(emojis if rng.random() < 0.5 else parts) for _ in range(rng.randint(1, 8)))
+        assert extract_emojis(text) == [match["emoji"] for match in emoji.emoji_list(text)], ascii(text)